@@ -0,0 +1,247 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BOOKMARKS_FILE = Path('bookmarks.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookmarks (
+    user_id TEXT NOT NULL,
+    activity_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (user_id, activity_id)
+);
+CREATE INDEX IF NOT EXISTS bookmarks_by_activity ON bookmarks (activity_id);
+"""
+
+ADD = 'add'
+REMOVE = 'remove'
+
+
+class BookmarkWriteError(Exception):
+    """Raised when bookmark writes could not be committed (they are undone in memory)"""
+
+
+class BookmarkStore:
+    """
+    Bookmarks held in memory as a per-user index and a reverse index from
+    activity to users, persisted to SQLite (WAL mode) by a background writer.
+
+    Reads never touch the database. Writes update the indexes immediately and
+    are queued; the writer drains the queue in batches so a burst of clicks
+    costs one transaction/fsync instead of one each (group commit).
+
+    A batch that fails to commit is retried `retries` times with backoff. If
+    it still fails, its writes are undone in the indexes and reported: add()
+    and remove() with wait=True raise BookmarkWriteError, as does the next
+    flush().
+    """
+
+    def __init__(self, path: Path = BOOKMARKS_FILE, batch_size: int = 256, flush_interval: float = 0.05,
+                 retries: int = 3, retry_delay: float = 0.1):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.by_user: Dict[str, Set[str]] = {}
+        self.by_activity: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        # Queued writes per (user, activity), so a failed write isn't undone over a later one
+        self._queued: Counter = Counter()
+        # Whether the database holds a bookmark whose failed write could not be
+        # undone yet because later writes for it were still queued
+        self._unsaved: Dict[Tuple[str, str], bool] = {}
+        self._failure: Optional[BookmarkWriteError] = None
+
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        for user_id, activity_id in self.conn.execute("SELECT user_id, activity_id FROM bookmarks"):
+            self.by_user.setdefault(user_id, set()).add(activity_id)
+            self.by_activity.setdefault(activity_id, set()).add(user_id)
+
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='bookmark-writer', daemon=True)
+        self._writer.start()
+
+    def add(self, user_id: str, activity_id: str, wait: bool = False) -> bool:
+        """Bookmark an activity; returns False if it was already bookmarked.
+        With wait=True, blocks until it is committed (or raises BookmarkWriteError)."""
+        with self._lock:
+            activities = self.by_user.setdefault(user_id, set())
+            if activity_id in activities:
+                return False
+            activities.add(activity_id)
+            self.by_activity.setdefault(activity_id, set()).add(user_id)
+            done = self._enqueue(ADD, user_id, activity_id)
+        if wait:
+            done.result()
+        return True
+
+    def remove(self, user_id: str, activity_id: str, wait: bool = False) -> bool:
+        """Remove a bookmark; returns False if there was none.
+        With wait=True, blocks until it is committed (or raises BookmarkWriteError)."""
+        with self._lock:
+            activities = self.by_user.get(user_id)
+            if not activities or activity_id not in activities:
+                return False
+            activities.discard(activity_id)
+            self.by_activity.get(activity_id, set()).discard(user_id)
+            done = self._enqueue(REMOVE, user_id, activity_id)
+        if wait:
+            done.result()
+        return True
+
+    def _enqueue(self, kind: str, user_id: str, activity_id: str) -> Future:
+        """Queue a write (caller holds _lock, so queue order matches index order)"""
+        done = Future()
+        self._queued[user_id, activity_id] += 1
+        self._queue.put((kind, user_id, activity_id, time.time(), done))
+        return done
+
+    def is_bookmarked(self, user_id: str, activity_id: str) -> bool:
+        return activity_id in self.by_user.get(user_id, ())
+
+    def bookmarks_for(self, user_id: str) -> Set[str]:
+        with self._lock:
+            return set(self.by_user.get(user_id, ()))
+
+    def popularity(self, activity_id: str) -> int:
+        """Number of users who bookmarked an activity"""
+        return len(self.by_activity.get(activity_id, ()))
+
+    def most_popular(self, limit: int = 10) -> List[Tuple[str, int]]:
+        with self._lock:
+            counts = [(aid, len(users)) for aid, users in self.by_activity.items() if users]
+        counts.sort(key=lambda pair: -pair[1])
+        return counts[:limit]
+
+    def flush(self):
+        """Block until every queued write has been committed. Raises
+        BookmarkWriteError if any write failed since the last flush."""
+        self._queue.join()
+        with self._lock:
+            failure, self._failure = self._failure, None
+        if failure:
+            raise failure
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        self.conn.close()
+
+    def _write_loop(self):
+        while True:
+            op = self._queue.get()
+            if op is None:
+                self._queue.task_done()
+                return
+
+            # Gather whatever else arrives within the flush window into one commit
+            batch = [op]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    op = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if op is None:
+                    stop = True
+                    break
+                batch.append(op)
+
+            try:
+                self._commit_with_retries(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if stop:
+                self._queue.task_done()
+                return
+
+    def _commit_with_retries(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                self._commit(batch)
+                break
+            except sqlite3.Error as e:
+                if attempt < self.retries:
+                    logger.warning(f"Bookmark commit failed ({str(e)}); retrying")
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                    continue
+                logger.error(f"Failed to persist {len(batch)} bookmark writes: {str(e)}")
+                failure = BookmarkWriteError(f"Could not save {len(batch)} bookmark changes: {str(e)}")
+                self._undo(batch, failure)
+                for *_, done in batch:
+                    done.set_exception(failure)
+                return
+        with self._lock:
+            self._dequeue(batch)
+            for _, user_id, activity_id, *_ in batch:
+                self._unsaved.pop((user_id, activity_id), None)
+        for *_, done in batch:
+            done.set_result(True)
+
+    def _dequeue(self, batch):
+        """Drop a processed batch from the queued counts (caller holds _lock)"""
+        for _, user_id, activity_id, *_ in batch:
+            key = (user_id, activity_id)
+            self._queued[key] -= 1
+            if self._queued[key] <= 0:
+                del self._queued[key]
+
+    def _undo(self, batch, failure: BookmarkWriteError):
+        """Put the indexes back to what the database holds for a batch that
+        was not committed. Bookmarks with later writes still queued are left
+        to those writes, remembering what the database holds in case they fail too."""
+        saved = {}
+        for kind, user_id, activity_id, *_ in batch:
+            # Before an add it wasn't bookmarked; before a remove it was
+            saved.setdefault((user_id, activity_id), kind == REMOVE)
+        with self._lock:
+            self._failure = failure
+            self._dequeue(batch)
+            for key, bookmarked in saved.items():
+                bookmarked = self._unsaved.pop(key, bookmarked)
+                if key in self._queued:
+                    self._unsaved[key] = bookmarked
+                    continue
+                user_id, activity_id = key
+                if bookmarked:
+                    self.by_user.setdefault(user_id, set()).add(activity_id)
+                    self.by_activity.setdefault(activity_id, set()).add(user_id)
+                else:
+                    self.by_user.get(user_id, set()).discard(activity_id)
+                    self.by_activity.get(activity_id, set()).discard(user_id)
+
+    def _commit(self, batch):
+        with self.conn:
+            for kind, user_id, activity_id, created_at, _ in batch:
+                if kind == ADD:
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO bookmarks (user_id, activity_id, created_at) VALUES (?, ?, ?)",
+                        (user_id, activity_id, created_at)
+                    )
+                else:
+                    self.conn.execute(
+                        "DELETE FROM bookmarks WHERE user_id = ? AND activity_id = ?",
+                        (user_id, activity_id)
+                    )
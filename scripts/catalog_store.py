@@ -0,0 +1,301 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import hashlib
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from normalize import activity_id, fold, search_fields
+from change_feed import diff_catalogs, diff_derived, encode_feed
+from interest_resolver import WORD_RE, InterestResolver, categorize
+from gazetteer import GAZETTEER
+from schemas import DecodeError, decode_catalog, encode_pretty, validate_catalog
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CATALOG_DIR = Path('catalog')
+LEGACY_FILE = Path('activities_data.json')
+MANIFEST_NAME = 'manifest.json'
+
+
+def atomic_write_json(path: Path, data) -> str:
+    """Write JSON to a temp file in the same directory and rename it into place.
+    Returns the sha256 of the written bytes."""
+    return atomic_write_bytes(path, encode_pretty(data))
+
+
+def atomic_write_bytes(path: Path, payload: bytes) -> str:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return hashlib.sha256(payload).hexdigest()
+
+
+class Catalog:
+    """
+    Immutable snapshot of the activity catalog together with its lookup indexes.
+    A new snapshot is built for every published version and swapped in whole.
+    """
+
+    def __init__(self, activities: List[Dict], version: int = 0):
+        self.version = version
+        self.activities = activities
+        self.by_id = {}
+        self.by_city = {}
+        self.search = {}
+        self.tokens = {}
+        self.categories = {}
+        self.by_category = {}
+        self.areas = {}
+        self.by_area = {}
+        vocabulary = []
+
+        for activity in activities:
+            aid = activity_id(activity)
+            self.by_id[aid] = activity
+            # Catalogs published before ingest normalization lack `search`
+            search = activity.get('search') or search_fields(activity)
+            self.search[aid] = search
+            self.tokens[aid] = frozenset(search['tokens'])
+            if search['city']:
+                self.by_city.setdefault(search['city'], []).append(activity)
+            # Borough and neighborhood keys, so location filtering is a lookup
+            self.areas[aid] = GAZETTEER.area_keys(search['city'], search['zip'])
+            for key in self.areas[aid]:
+                self.by_area.setdefault(key, []).append(activity)
+            self.categories[aid] = categorize(self.tokens[aid])
+            for category in self.categories[aid]:
+                self.by_category.setdefault(category, []).append(activity)
+            vocabulary.extend(WORD_RE.findall(fold(f"{activity.get('name') or ''} {activity.get('description') or ''}")))
+
+        # Spelling index over the words this catalog actually uses
+        self.interests = InterestResolver(vocabulary)
+
+    def __len__(self):
+        return len(self.activities)
+
+
+class CatalogStore:
+    """
+    Publishes catalog versions atomically and loads the current one.
+
+    Layout:
+        catalog/manifest.json             -> points at the current version
+        catalog/activities_v<N>.json      -> immutable version files
+        catalog/changes_v<N>.jsonl        -> change feed from version N-1 to N
+        catalog/derived_v<N>.jsonl        -> derived fields that changed in version N
+        activities_data.json              -> copy of the latest version for older readers
+    """
+
+    def __init__(self, root: Path = CATALOG_DIR, legacy_file: Optional[Path] = LEGACY_FILE,
+                 keep_versions: int = 5):
+        self.root = Path(root)
+        self.manifest_file = self.root / MANIFEST_NAME
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        self.keep_versions = keep_versions
+
+    def read_manifest(self) -> Optional[Dict]:
+        """Return the current manifest, or None if nothing has been published yet"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read catalog manifest: {str(e)}")
+            return None
+
+    def manifest_mtime(self) -> Optional[int]:
+        try:
+            return self.manifest_file.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def publish(self, activities: List[Dict]) -> Dict:
+        """Write a new catalog version, then flip the manifest to point at it"""
+        # Raises schemas.ValidationError before anything is written
+        activities = validate_catalog(activities)
+        # Number from the manifest; the previous records are only needed for the diffs
+        manifest = self.read_manifest()
+        previous_version = int(manifest['version']) if manifest else 0
+        previous, _ = self._load_activities(manifest)
+        version = previous_version + 1
+        version_file = f"activities_v{version}.json"
+        changes_file = f"changes_v{version}.jsonl"
+        derived_file = f"derived_v{version}.jsonl"
+
+        checksum = atomic_write_json(self.root / version_file, activities)
+        # Keyed delta against the previous version for incremental consumers
+        events = diff_catalogs(previous, activities)
+        atomic_write_bytes(self.root / changes_file, encode_feed(events))
+        # Derived fields the feed leaves out, so consumers needn't recompute them
+        derived = diff_derived(previous, activities)
+        atomic_write_bytes(self.root / derived_file, encode_feed(derived))
+
+        manifest = {
+            'version': version,
+            'file': version_file,
+            'count': len(activities),
+            'sha256': checksum,
+            'previous_version': previous_version,
+            'changes': changes_file,
+            'change_count': len(events),
+            'derived': derived_file,
+            'derived_count': len(derived),
+            'published_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        # The manifest rename is the commit point for readers
+        atomic_write_json(self.manifest_file, manifest)
+
+        if self.legacy_file:
+            atomic_write_json(self.legacy_file, activities)
+
+        self._prune(version)
+        logger.info(f"Published catalog version {version} ({len(activities)} activities)")
+        return manifest
+
+    def _prune(self, current_version: int):
+        """Remove version files and change feeds older than the retention window"""
+        oldest_kept = current_version - self.keep_versions + 1
+        for path in [*self.root.glob('activities_v*.json'), *self.root.glob('changes_v*.jsonl'),
+                     *self.root.glob('derived_v*.jsonl')]:
+            try:
+                version = int(path.stem.rsplit('_v', 1)[1])
+            except (IndexError, ValueError):
+                continue
+            if version < oldest_kept:
+                try:
+                    path.unlink()
+                except OSError as e:
+                    logger.warning(f"Could not remove old catalog {path}: {str(e)}")
+
+    def load(self) -> Catalog:
+        """Load the current catalog version (or the legacy file if none is published)"""
+        activities, version = self._load_activities(self.read_manifest())
+        return Catalog(activities, version=version)
+
+    def _read_activities(self, path: Path) -> Optional[List[Dict]]:
+        """Decode one catalog file, or None if it is missing or corrupt"""
+        try:
+            return decode_catalog(path.read_bytes())
+        except (OSError, DecodeError) as e:
+            logger.error(f"Could not load catalog {path}: {str(e)}")
+            return None
+
+    def _load_activities(self, manifest: Optional[Dict]) -> Tuple[List[Dict], int]:
+        """
+        Records of the manifest's version and the version they came from. If
+        that file can't be read, fall back to the newest older version still
+        on disk, then to the legacy file.
+        """
+        if manifest:
+            current = int(manifest['version'])
+            for version in range(current, 0, -1):
+                path = self.root / (manifest['file'] if version == current else f"activities_v{version}.json")
+                if version != current and not path.exists():
+                    continue
+                activities = self._read_activities(path)
+                if activities is not None:
+                    if version != current:
+                        logger.warning(f"Catalog version {current} is unreadable; using version {version}")
+                    return activities, version
+
+        if self.legacy_file and self.legacy_file.exists():
+            activities = self._read_activities(self.legacy_file)
+            if activities is not None:
+                return activities, 0
+
+        logger.warning("No activities data found")
+        return [], 0
+
+
+class CatalogWatcher:
+    """
+    Polls the catalog manifest and hot-swaps a rebuilt Catalog when a new
+    version is published. Readers grab `watcher.catalog` once per request and
+    keep using that snapshot, so a swap never blocks or changes in-flight work.
+    """
+
+    def __init__(self, store: CatalogStore, interval: float = 5.0,
+                 on_swap: Optional[Callable[[Catalog], None]] = None,
+                 catalog: Optional[Catalog] = None):
+        self.store = store
+        self.interval = interval
+        self.on_swap = on_swap
+        # An already-loaded catalog (e.g. inherited by a forked worker) is reused as-is
+        if catalog is not None:
+            self._catalog = catalog
+            self._seen_mtime = None  # compare versions on the first poll
+        else:
+            self._catalog = store.load()
+            self._seen_mtime = store.manifest_mtime()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def catalog(self) -> Catalog:
+        return self._catalog
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='catalog-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_for_update()
+            except Exception as e:
+                logger.error(f"Catalog reload failed: {str(e)}")
+
+    def check_for_update(self) -> bool:
+        """Reload and swap the catalog if the manifest moved to a newer version"""
+        mtime = self.store.manifest_mtime()
+        if mtime is None or mtime == self._seen_mtime:
+            return False
+
+        manifest = self.store.read_manifest()
+        if not manifest:
+            # Unreadable right now; try again on the next poll
+            return False
+        if int(manifest.get('version', 0)) <= self._catalog.version:
+            self._seen_mtime = mtime
+            return False
+
+        # Build the new snapshot fully before publishing the reference
+        catalog = self.store.load()
+        self._seen_mtime = mtime
+        if catalog.version <= self._catalog.version:
+            # The new version file is unreadable and load() fell back to one
+            # we already have or older; keep serving the current snapshot
+            return False
+        self._catalog = catalog
+        logger.info(f"Hot-swapped catalog to version {catalog.version} ({len(catalog)} activities)")
+
+        if self.on_swap:
+            self.on_swap(catalog)
+        return True
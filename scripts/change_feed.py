@@ -0,0 +1,129 @@
+import json
+from typing import Dict, Iterable, List
+
+from normalize import activity_id
+
+ADDED = 'add'
+UPDATED = 'update'
+REMOVED = 'remove'
+
+# Fields computed at ingest relative to the whole catalog (review priors,
+# recency weights) or from other fields; they shift without the listing
+# changing, so the change feed leaves them out. Their current values are
+# published separately by diff_derived, which consumers apply with
+# apply_derived after apply_feed instead of recomputing them.
+DERIVED_FIELDS = frozenset({'review_summary', 'search'})
+
+
+def _source(record: Dict) -> Dict:
+    return {key: value for key, value in record.items() if key not in DERIVED_FIELDS}
+
+
+def _derived(record: Dict) -> Dict:
+    return {key: value for key, value in record.items() if key in DERIVED_FIELDS}
+
+
+def _flatten(record: Dict) -> Dict:
+    """One level of dotted keys for nested dicts, e.g. location.zip"""
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict) and value:
+            for sub_key, sub_value in value.items():
+                flat[f"{key}.{sub_key}"] = sub_value
+        else:
+            flat[key] = value
+    return flat
+
+
+def diff_records(old: Dict, new: Dict) -> Dict:
+    """Changed/added fields (with new values) and removed fields between two records"""
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    changes = {key: value for key, value in new_flat.items() if old_flat.get(key, object()) != value}
+    removed = sorted(key for key in old_flat if key not in new_flat)
+    return {'changes': changes, 'removed_fields': removed}
+
+
+def diff_catalogs(old: Iterable[Dict], new: Iterable[Dict]) -> List[Dict]:
+    """
+    Keyed diff between two catalog versions as change-feed events:
+    {"op": "add", "id", "record"}, {"op": "update", "id", "changes",
+    "removed_fields"} and {"op": "remove", "id"}. DERIVED_FIELDS are not
+    part of the feed.
+    """
+    old_by_id = {activity_id(a): _source(a) for a in old}
+    new_by_id = {activity_id(a): _source(a) for a in new}
+
+    events = []
+    for aid, record in new_by_id.items():
+        previous = old_by_id.get(aid)
+        if previous is None:
+            events.append({'op': ADDED, 'id': aid, 'record': record})
+        elif previous != record:
+            events.append({'op': UPDATED, 'id': aid, **diff_records(previous, record)})
+    for aid in old_by_id:
+        if aid not in new_by_id:
+            events.append({'op': REMOVED, 'id': aid})
+    return events
+
+
+def diff_derived(old: Iterable[Dict], new: Iterable[Dict]) -> List[Dict]:
+    """
+    {"id", "review_summary", "search"} for every record in the new version
+    whose derived values differ from the old one (including added records)
+    """
+    old_by_id = {activity_id(a): _derived(a) for a in old}
+    entries = []
+    for activity in new:
+        aid = activity_id(activity)
+        values = _derived(activity)
+        if values and old_by_id.get(aid) != values:
+            entries.append({'id': aid, **values})
+    return entries
+
+
+def encode_feed(events: List[Dict]) -> bytes:
+    """JSON Lines encoding of a change feed"""
+    return ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events).encode('utf-8')
+
+
+def read_feed(path) -> List[Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def apply_feed(activities: List[Dict], events: Iterable[Dict]) -> List[Dict]:
+    """Apply a change feed to a catalog (what a downstream consumer does)"""
+    by_id = {activity_id(a): a for a in activities}
+    for event in events:
+        if event['op'] == REMOVED:
+            by_id.pop(event['id'], None)
+        elif event['op'] == ADDED:
+            by_id[event['id']] = event['record']
+        elif event['op'] == UPDATED:
+            record = by_id.setdefault(event['id'], {})
+            for key, value in event['changes'].items():
+                if '.' in key:
+                    parent, child = key.split('.', 1)
+                    if not isinstance(record.get(parent), dict):
+                        record[parent] = {}
+                    record[parent][child] = value
+                else:
+                    record[key] = value
+            for key in event['removed_fields']:
+                if '.' in key:
+                    parent, child = key.split('.', 1)
+                    if isinstance(record.get(parent), dict):
+                        record[parent].pop(child, None)
+                else:
+                    record.pop(key, None)
+    return list(by_id.values())
+
+
+def apply_derived(activities: List[Dict], entries: Iterable[Dict]) -> List[Dict]:
+    """Apply published derived values (from diff_derived) to a catalog"""
+    by_id = {activity_id(a): a for a in activities}
+    for entry in entries:
+        record = by_id.get(entry['id'])
+        if record is not None:
+            record.update(_derived(entry))
+    return list(by_id.values())
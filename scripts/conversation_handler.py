@@ -1,14 +1,27 @@
-import json
 import logging
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
 from enum import Enum
 import sys
+import threading
+
+from catalog_store import Catalog, CatalogStore, CatalogWatcher, activity_id
+from recommendation_cache import RecommendationCache, child_age, profile_signature
+from refinement import CandidatePool, parse_feedback
+from bookmark_store import BookmarkStore, BookmarkWriteError
+from normalize import fold, token_set
+from gazetteer import GAZETTEER, NEIGHBORHOOD
+from schemas import decode_user_data, encode
+from slot_extractor import NAME_ONLY_RE, birthdate_for_age, extract_slots, parse_child
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Reply to a turn the handler failed on
+TROUBLE_MESSAGE = "I'm having trouble understanding. Could you try rephrasing that?"
+
 class ConversationState(Enum):
     INITIAL = "initial"
     LOCATION = "location"
@@ -23,15 +36,26 @@ class ConversationHandler:
     Works with the existing OpenAI chat implementation.
     """
     
-    def __init__(self):
-        # Load activities data
+    def __init__(self, watch_catalog: bool = True, catalog: Optional[Catalog] = None):
+        # Load the current catalog version; the watcher hot-swaps newer ones
         self.activities_file = Path('activities_data.json')
-        if self.activities_file.exists():
-            with open(self.activities_file, 'r') as f:
-                self.activities = json.load(f)
-        else:
-            logger.warning("No activities data found")
-            self.activities = []
+        self.catalog_store = CatalogStore(legacy_file=self.activities_file)
+        # Ranked pools for popular profiles, dropped whenever the catalog changes
+        self.recommendation_cache = RecommendationCache()
+        # Candidate pools behind recently shown lists, keyed by the profile, the
+        # ids shown and the refinements so far, so sessions never share constraints
+        self.candidate_pools = OrderedDict()
+        self._pools_lock = threading.Lock()
+        self.max_candidate_pools = 256
+        # Opened on first use so plain chat turns never touch the database
+        self._bookmarks = None
+        self.catalog_watcher = CatalogWatcher(
+            self.catalog_store,
+            on_swap=lambda catalog: self.recommendation_cache.invalidate(catalog.version),
+            catalog=catalog
+        )
+        if watch_catalog:
+            self.catalog_watcher.start()
 
         # Define preset questions and flow
         self.conversation_flow = {
@@ -62,6 +86,27 @@ class ConversationHandler:
             }
         }
 
+    @property
+    def catalog(self):
+        """Current catalog snapshot; take it once per request and reuse it"""
+        return self.catalog_watcher.catalog
+
+    @property
+    def activities(self) -> List[Dict]:
+        return self.catalog.activities
+
+    @property
+    def bookmarks(self) -> BookmarkStore:
+        if self._bookmarks is None:
+            self._bookmarks = BookmarkStore()
+        return self._bookmarks
+
+    def close(self):
+        """Stop watching the catalog and commit any queued bookmark writes"""
+        self.catalog_watcher.stop()
+        if self._bookmarks is not None:
+            self._bookmarks.close()
+
     def format_system_prompt(self, conversation_state: ConversationState = ConversationState.INITIAL, user_data: Dict = None) -> str:
         """
         Creates the system prompt based on conversation state
@@ -121,24 +166,32 @@ class ConversationHandler:
 
     def determine_next_state(self, current_state: ConversationState, user_data: Dict) -> ConversationState:
         """
-        Determines the next conversation state based on current state and user data
+        Determines the next conversation state based on current state and user data:
+        the first state whose slot is still empty, so an answer that fills
+        several slots at once skips the questions it already answered
         """
-        if current_state == ConversationState.INITIAL and user_data.get('location'):
+        if not user_data.get('location'):
+            return ConversationState.INITIAL
+        if 'num_children' not in user_data:
             return ConversationState.LOCATION
-        elif current_state == ConversationState.LOCATION and user_data.get('num_children'):
+        children = user_data.get('children', [])
+        if len(children) < user_data['num_children']:
             return ConversationState.NUM_CHILDREN
-        elif current_state == ConversationState.NUM_CHILDREN and user_data.get('children'):
-            return ConversationState.CHILD_DETAILS
-        elif current_state == ConversationState.CHILD_DETAILS:
-            # Check if all children have interests and preferred activities
-            children = user_data.get('children', [])
-            all_complete = all(
-                child.get('interests') and child.get('preferred_activity')
-                for child in children
-            )
-            if all_complete:
-                return ConversationState.RECOMMENDATIONS
-        return current_state
+        # Check if all children have interests and preferred activities
+        for child in children:
+            if not child.get('interests'):
+                return ConversationState.CHILD_DETAILS
+            if not child.get('preferred_activity'):
+                return ConversationState.INTERESTS
+        return ConversationState.RECOMMENDATIONS
+
+    def _current_child(self, user_data: Dict) -> Optional[Dict]:
+        """The child the flow is asking about: the first one still missing details"""
+        children = user_data.get('children') or []
+        for child in children:
+            if not child.get('interests') or not child.get('preferred_activity'):
+                return child
+        return children[-1] if children else None
 
     def get_next_question(self, current_state: ConversationState, user_data: Dict) -> Dict:
         """Get the next question based on conversation state and user data"""
@@ -153,7 +206,7 @@ class ConversationHandler:
         
         # Format message with child's name if needed
         if '{child_name}' in message and user_data.get('children'):
-            current_child = user_data['children'][-1]
+            current_child = self._current_child(user_data)
             message = message.format(child_name=current_child['name'])
 
         return {
@@ -163,17 +216,37 @@ class ConversationHandler:
 
     def process_response(self, response: str, current_state: ConversationState, user_data: Dict) -> Dict:
         """Process user response and return updated data"""
-        updated_data = user_data.copy()
-        
+        updated_data = dict(user_data)
+        updated_data['children'] = [dict(child) for child in user_data.get('children', [])]
+
+        if current_state == ConversationState.NUM_CHILDREN:
+            # The answer the question asked for, read as a whole ("Mary Ann, 2017-05-01")
+            child = parse_child(response)
+            if child:
+                updated_data['children'].append(child)
+                return updated_data
+
+        # Everything the answer mentions, not just what this state asked for;
+        # answers about a child's interests are not read for names and ages
+        slots = extract_slots(
+            response,
+            children=current_state not in (ConversationState.CHILD_DETAILS, ConversationState.INTERESTS),
+            about_children=current_state in (ConversationState.LOCATION, ConversationState.NUM_CHILDREN)
+        )
+        filled = self._apply_slots(updated_data, slots)
+        if self.conversation_flow[current_state]['expected_data'] in filled:
+            return updated_data
+
         if current_state == ConversationState.INITIAL:
-            updated_data['location'] = response.strip()
+            # "Brooklyn, 2 kids" -> Brooklyn; places the gazetteer does not know are kept as typed
+            area = GAZETTEER.resolve(response)
+            updated_data['location'] = area.name if area is not None else response.strip()
             
         elif current_state == ConversationState.LOCATION:
             try:
                 updated_data['num_children'] = int(response.strip())
-                updated_data['children'] = []
             except ValueError:
-                return None
+                return updated_data if filled else None
             
         elif current_state == ConversationState.NUM_CHILDREN:
             try:
@@ -181,31 +254,271 @@ class ConversationHandler:
                 child = {'name': name, 'birthdate': birthdate}
                 updated_data['children'] = updated_data.get('children', []) + [child]
             except ValueError:
-                return None
+                if updated_data.get('pending_ages') and NAME_ONLY_RE.fullmatch(response.strip()):
+                    # A name for an age given earlier ("1 child, age 6" ... "Mia")
+                    age, *pending = updated_data.pop('pending_ages')
+                    if pending:
+                        updated_data['pending_ages'] = pending
+                    updated_data['children'].append(
+                        {'name': response.strip(), 'birthdate': birthdate_for_age(age)}
+                    )
+                    return updated_data
+                return updated_data if filled else None
             
         elif current_state == ConversationState.CHILD_DETAILS:
             if updated_data.get('children'):
-                current_child = updated_data['children'][-1]
+                current_child = self._current_child(updated_data)
                 current_child['interests'] = [x.strip() for x in response.split(',')]
             
         elif current_state == ConversationState.INTERESTS:
             if updated_data.get('children'):
-                current_child = updated_data['children'][-1]
+                current_child = self._current_child(updated_data)
                 current_child['preferred_activity'] = response.strip()
 
         return updated_data
 
-    def generate_recommendations(self, user_data: Dict) -> List[Dict]:
+    def _apply_slots(self, user_data: Dict, slots: Dict) -> set:
+        """
+        Merge extracted slots into user_data in place; returns the names
+        (as in expected_data) of the slots that were filled
+        """
+        filled = set()
+        if slots.get('location'):
+            user_data['location'] = slots['location']
+            filled.add('location')
+
+        children = user_data.setdefault('children', [])
+        for extracted in slots.get('children', []):
+            known = next((c for c in children if fold(c.get('name')) == fold(extracted['name'])), None)
+            if known is not None:
+                known['birthdate'] = extracted['birthdate']
+            else:
+                children.append(dict(extracted))
+            filled.add('child_info')
+        if slots.get('ages'):
+            # Named in a later answer
+            user_data['pending_ages'] = user_data.get('pending_ages', []) + slots['ages']
+        if slots.get('num_children'):
+            user_data['num_children'] = slots['num_children']
+            filled.add('num_children')
+        if children:
+            # Naming more children than the stated count corrects the count
+            user_data['num_children'] = max(user_data.get('num_children', 0), len(children))
+
+        for owner, interests in slots.get('interests', {}).items():
+            child = next((c for c in children if owner and fold(c.get('name')) == fold(owner)), None)
+            child = child or self._current_child(user_data)
+            if child is None:
+                # Interests mentioned before any child was named
+                user_data['pending_interests'] = user_data.get('pending_interests', []) + interests
+                continue
+            child['interests'] = list(dict.fromkeys(child.get('interests', []) + interests))
+            filled.add('interests')
+        if children and user_data.get('pending_interests'):
+            child = next((c for c in children if not c.get('interests')), None)
+            if child is not None:
+                child['interests'] = user_data.pop('pending_interests')
+                filled.add('interests')
+
+        if slots.get('preferred_activity') and children:
+            self._current_child(user_data)['preferred_activity'] = slots['preferred_activity']
+            filled.add('preferred_activity')
+        return filled
+
+    def _recommendation_profile(self, user_data: Dict) -> Dict:
+        """The fields of user_data that recommendations depend on, per child"""
+        children = user_data.get('children') or [{}]
+        return {
+            'location': user_data.get('location'),
+            'children': [
+                {
+                    'age': child_age(child.get('birthdate')),
+                    'interests': child.get('interests') or [],
+                    'preferred_activity': child.get('preferred_activity'),
+                }
+                for child in children
+            ],
+        }
+
+    def _resolve_interest(self, catalog: Catalog, text: Optional[str]) -> Tuple[frozenset, Optional[str]]:
+        """Spelling-corrected stemmed terms and canonical category for free text"""
+        if not text:
+            return frozenset(), None
+        resolved = catalog.interests.resolve(text)
+        return token_set(resolved['term']), resolved['category']
+
+    def _rank_candidates(self, catalog: Catalog, profile: Dict) -> List[Tuple[float, str]]:
+        """
+        Scores every activity near the user and returns (score, activity_id)
+        pairs, best first
+        """
+        location = fold(profile['location'])
+        area = GAZETTEER.resolve(location)
+        pool = catalog.activities
+        if area is not None:
+            # Rank the whole borough; the neighborhood itself gets a boost below
+            pool = catalog.by_area.get(area.borough) or pool
+        elif location:
+            local = [
+                activity
+                for city, activities in catalog.by_city.items()
+                if location in city or city in location
+                for activity in activities
+            ]
+            if local:
+                pool = local
+
+        children = []
+        for child in profile['children']:
+            interests = [self._resolve_interest(catalog, text) for text in child['interests']]
+            interests = [(terms, category) for terms, category in interests if terms]
+            preferred, preferred_category = self._resolve_interest(catalog, child['preferred_activity'])
+            children.append((child['age'], interests, preferred, preferred_category))
+
+        ranked = []
+        for activity in pool:
+            aid = activity_id(activity)
+            age_range = activity.get('age_range')
+            tokens = catalog.tokens[aid]
+            categories = catalog.categories[aid]
+
+            # Each child the listing's age range admits scores it on their own interests
+            fits = []
+            for age, interests, preferred, preferred_category in children:
+                if age is not None and age_range and not (
+                        age_range.get('min', 0) <= age <= age_range.get('max', 99)):
+                    continue
+                fit = 0.0
+                for terms, category in interests:
+                    if terms <= tokens:
+                        fit += 2.0
+                    elif category in categories:
+                        fit += 1.5
+                if preferred and preferred <= tokens:
+                    fit += 3.0
+                elif preferred_category in categories:
+                    fit += 2.0
+                if age is not None and age_range:
+                    fit += 1.0
+                fits.append(fit)
+            if not fits:
+                continue
+
+            # The best-suited child decides; siblings who can join too add a little
+            score = max(fits) + 0.5 * (len(fits) - 1)
+            if area is not None and area.kind == NEIGHBORHOOD and area.key in catalog.areas[aid]:
+                score += 1.5
+            summary = activity.get('review_summary')
+            if summary:
+                score += summary['bayesian'] / 10
+            else:
+                try:
+                    score += float((activity.get('rating') or {}).get('ratingValue', 0)) / 10
+                except (TypeError, ValueError):
+                    pass
+
+            ranked.append((score, aid))
+
+        # Stable sort keeps catalog (position) order among equal scores
+        ranked.sort(key=lambda pair: -pair[0])
+        return ranked
+
+    def generate_recommendations(self, user_data: Dict, max_results: int = 5) -> List[Dict]:
         """
         Filters activities based on user data
         """
-        recommendations = []
-        
-        # Add recommendation logic here
-        # This would feed into the OpenAI prompt
-        
+        catalog = self.catalog
+        profile = self._recommendation_profile(user_data)
+        signature = self._profile_signature(catalog, profile)
+
+        ranked = self.recommendation_cache.get(signature, catalog.version)
+        if ranked is None:
+            ranked = tuple(self._rank_candidates(catalog, profile))
+            self.recommendation_cache.put(signature, catalog.version, ranked)
+
+        recommendations = [catalog.by_id[aid] for _, aid in ranked[:max_results]]
+        self._remember_pool(
+            signature, recommendations, CandidatePool(profile, ranked, catalog.version, home=profile['location'])
+        )
         return recommendations
 
+    def _profile_signature(self, catalog: Catalog, profile: Dict) -> str:
+        """Cache key for a recommendation profile"""
+        # Sign the corrected interests so "balet" and "ballet" share a cache entry
+        resolve = catalog.interests.resolve
+        area = GAZETTEER.resolve(profile['location'])
+        return profile_signature(
+            area.key if area is not None else profile['location'],
+            [
+                (child['age'], [resolve(text)['term'] for text in child['interests']],
+                 resolve(child['preferred_activity'])['term'] if child['preferred_activity'] else None)
+                for child in profile['children']
+            ]
+        )
+
+    @staticmethod
+    def _pool_key(signature: str, shown: List[str], state: Dict) -> Tuple:
+        excluded = tuple(sorted(state.get('excluded', ())))
+        constraints = tuple(sorted(state.get('constraints', {}).items()))
+        return signature, tuple(shown), excluded, constraints
+
+    def _remember_pool(self, signature: str, recommendations: List[Dict], pool: CandidatePool):
+        """Keep the pool behind a shown list so refinements can reuse it"""
+        key = self._pool_key(signature, [activity_id(rec) for rec in recommendations], pool.state())
+        with self._pools_lock:
+            self.candidate_pools[key] = pool
+            self.candidate_pools.move_to_end(key)
+            while len(self.candidate_pools) > self.max_candidate_pools:
+                self.candidate_pools.popitem(last=False)
+
+    def _select_from_pool(self, catalog: Catalog, pool: CandidatePool, max_results: int) -> List[Dict]:
+        """Re-filter and re-rank a retained pool under its accumulated constraints"""
+        constraints = pool.constraints
+        location = fold(pool.home)
+        activity_type, activity_category = self._resolve_interest(catalog, constraints.get('activity_type'))
+        max_price = constraints.get('max_price')
+        nearby = None
+        area = GAZETTEER.resolve(location) if constraints.get('closer') else None
+        if area is not None:
+            # The user's own neighborhood when it has listings, else their borough
+            nearby = area.key if catalog.by_area.get(area.key) else area.borough
+
+        selected = []
+        for score, aid in pool.ranked:
+            activity = catalog.by_id.get(aid)
+            if activity is None or aid in pool.excluded:
+                continue
+
+            if nearby:
+                if nearby not in catalog.areas[aid]:
+                    continue
+            elif constraints.get('closer') and location:
+                search = catalog.search[aid]
+                city = search['city']
+                if not city or not (location in city or city in location or location == search['zip']):
+                    continue
+
+            prices = activity.get('prices') or []
+            if max_price is not None and not (prices and min(prices) < max_price):
+                continue
+
+            if activity_type:
+                if activity_type <= catalog.tokens[aid]:
+                    score += 3.0
+                elif activity_category in catalog.categories[aid]:
+                    score += 2.0
+                else:
+                    continue
+
+            cheapest = min(prices) if prices else float('inf')
+            selected.append((score, cheapest, activity))
+
+        if constraints.get('cheaper'):
+            selected.sort(key=lambda entry: (entry[1], -entry[0]))
+        else:
+            selected.sort(key=lambda entry: -entry[0])
+        return [activity for _, _, activity in selected[:max_results]]
+
     def format_recommendations(self, recommendations: List[Dict]) -> str:
         """
         Formats recommendations for the chat response
@@ -228,17 +541,70 @@ class ConversationHandler:
         """
         Handles bookmarking an activity for a user
         """
-        # Add bookmark logic here
-        # This would integrate with your existing system
+        if activity_id not in self.catalog.by_id:
+            logger.warning(f"Cannot bookmark unknown activity: {activity_id}")
+            return False
+        try:
+            # Wait for the group commit so the user isn't told it saved when it didn't
+            self.bookmarks.add(user_id, activity_id, wait=True)
+        except BookmarkWriteError as e:
+            logger.error(f"Could not bookmark {activity_id} for {user_id}: {str(e)}")
+            return False
         return True
 
-    def refine_recommendations(self, feedback: str, previous_recommendations: List[Dict]) -> List[Dict]:
+    def is_bookmarked(self, activity_id: str, user_id: str) -> bool:
+        return self.bookmarks.is_bookmarked(user_id, activity_id)
+
+    def refine_recommendations(self, feedback: str, previous_recommendations: List[Dict],
+                               user_data: Optional[Dict] = None, max_results: int = 5) -> List[Dict]:
         """
         Refines recommendations based on user feedback
         """
-        # Add refinement logic here
-        # This would feed into the OpenAI prompt
-        return []
+        return self._refine(feedback, previous_recommendations, user_data or {}, max_results)[0]
+
+    def _refine(self, feedback: str, previous_recommendations: List[Dict], user_data: Dict,
+                max_results: int = 5) -> Tuple[List[Dict], CandidatePool]:
+        """Refined recommendations and the pool behind them; the session's
+        earlier refinements come from user_data['refinement']"""
+        catalog = self.catalog
+        shown = [activity_id(rec) for rec in previous_recommendations]
+        profile = self._recommendation_profile(user_data)
+        signature = self._profile_signature(catalog, profile)
+        state = user_data.get('refinement') or {}
+        with self._pools_lock:
+            pool = self.candidate_pools.get(self._pool_key(signature, shown, state))
+        if pool is None or pool.version != catalog.version:
+            # Nothing retained for this list (or the catalog changed): rank afresh
+            pool = CandidatePool(
+                profile, self._rank_candidates(catalog, profile), catalog.version, home=profile['location']
+            ).with_state(state)
+
+        deltas = parse_feedback(feedback, previous_recommendations)
+        pool = pool.refined(deltas, shown)
+        if deltas['cheaper']:
+            shown_prices = [min(rec['prices']) for rec in previous_recommendations if rec.get('prices')]
+            if shown_prices:
+                pool.constraints['max_price'] = min(shown_prices)
+
+        recommendations = self._select_from_pool(catalog, pool, max_results)
+        if not recommendations:
+            # The retained pool ran dry: widen the profile and run full retrieval
+            profile = dict(pool.profile)
+            if pool.constraints.get('activity_type'):
+                profile['children'] = [
+                    dict(child, preferred_activity=pool.constraints['activity_type'])
+                    for child in profile['children']
+                ]
+            if not pool.constraints.get('closer'):
+                profile['location'] = None
+            pool = CandidatePool(
+                profile, self._rank_candidates(catalog, profile), catalog.version,
+                pool.excluded, pool.constraints, pool.home
+            )
+            recommendations = self._select_from_pool(catalog, pool, max_results)
+
+        self._remember_pool(signature, recommendations, pool)
+        return recommendations, pool
 
     def handle_conversation(self, user_input: str, current_state: str, user_data: Dict) -> Dict:
         """Main handler for conversation flow"""
@@ -249,17 +615,30 @@ class ConversationHandler:
             if user_input == 'start':
                 # Initial conversation
                 next_question = self.get_next_question(ConversationState.INITIAL, {})
-                print("Returning initial response:", {  # Add debug logging
-                    'message': next_question['message'],
-                    'nextState': next_question['next_state'].value,
-                    'userData': {}
-                })
+                logger.debug(f"Returning initial response: {next_question['message']}")
                 return {
                     'message': next_question['message'],
-                    'nextState': next_question['next_state'].value,
+                    'nextState': ConversationState.INITIAL.value,
                     'userData': {}
                 }
                 
+            if current_state == ConversationState.RECOMMENDATIONS:
+                # Feedback on the last list refines it
+                catalog = self.catalog
+                previous = [
+                    catalog.by_id[aid] for aid in user_data.get('recommended_ids', [])
+                    if aid in catalog.by_id
+                ]
+                recommendations, pool = self._refine(user_input, previous, user_data)
+                updated_data = dict(
+                    user_data, recommended_ids=[activity_id(r) for r in recommendations], refinement=pool.state()
+                )
+                return {
+                    'recommendation': self.format_recommendations(recommendations),
+                    'nextState': current_state.value,
+                    'userData': updated_data
+                }
+
             # Process user response
             updated_data = self.process_response(user_input, current_state, user_data)
             if updated_data is None:
@@ -270,26 +649,39 @@ class ConversationHandler:
                     'userData': user_data
                 }
                 
-            # Get next question
-            next_question = self.get_next_question(current_state, updated_data)
+            # Move on to the first question this answer left unanswered
+            next_state = self.determine_next_state(current_state, updated_data)
+
+            if next_state == ConversationState.RECOMMENDATIONS:
+                recommendations = self.generate_recommendations(updated_data)
+                updated_data['recommended_ids'] = [activity_id(r) for r in recommendations]
+                updated_data.pop('refinement', None)
+                return {
+                    'recommendation': self.format_recommendations(recommendations),
+                    'nextState': next_state.value,
+                    'userData': updated_data
+                }
+
+            next_question = self.get_next_question(next_state, updated_data)
             
             return {
                 'recommendation': next_question['message'],
-                'nextState': next_question['next_state'].value,
+                'nextState': next_state.value,
                 'userData': updated_data
             }
             
         except Exception as e:
             logger.error(f"Error handling conversation: {str(e)}")
             return {
-                'recommendation': "I'm having trouble understanding. Could you try rephrasing that?",
-                'nextState': current_state,
+                'recommendation': TROUBLE_MESSAGE,
+                # current_state is still the raw string if it was not a valid state
+                'nextState': getattr(current_state, 'value', current_state),
                 'userData': user_data
             }
 
 if __name__ == "__main__":
     # Get arguments passed from Node.js
-    user_data = json.loads(sys.argv[1])
+    user_data = decode_user_data(sys.argv[1])
     current_state = sys.argv[2]
     
     # Create handler and process request
@@ -297,4 +689,4 @@ if __name__ == "__main__":
     result = handler.handle_conversation('start', current_state, user_data)
     
     # Print result as JSON (this is what PythonShell reads)
-    print(json.dumps(result)) 
\ No newline at end of file
+    print(encode(result).decode('utf-8'))
\ No newline at end of file
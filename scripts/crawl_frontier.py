@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FRONTIER_FILE = Path('crawl_frontier.db')
+
+# Work item kinds, in the order they are discovered
+DIRECTORY = 'directory'
+DETAIL = 'detail'
+IMAGE = 'image'
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    payload TEXT,
+    result TEXT,
+    error TEXT,
+    updated_at REAL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS frontier_ready ON frontier (kind, status, priority);
+"""
+
+
+def worker_name() -> str:
+    """Unique lease owner name for this process"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class CrawlFrontier:
+    """
+    Persistent crawl queue shared by any number of scraper processes.
+    Each item is identified by its kind and a key (a URL or an activity id).
+
+    Items are leased with an expiry, so work held by a killed process becomes
+    available again once its lease runs out, and completed items are never
+    fetched twice. Results are stored alongside each item so the catalog can
+    be assembled from the frontier once it drains.
+    """
+
+    def __init__(self, path: Path = FRONTIER_FILE, lease_seconds: float = 300, max_attempts: int = 3):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def enqueue(self, kind: str, key: str, payload: Optional[Dict] = None, priority: int = 0) -> bool:
+        """Add a work item; returns False if it was already known"""
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO frontier (kind, key, payload, priority, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (kind, key, json.dumps(payload) if payload is not None else None, priority, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def lease(self, worker_id: str, kind: str, limit: int = 1) -> List[Dict]:
+        """Claim up to `limit` ready items of one kind for this worker"""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = self.conn.execute(
+                "SELECT kind, key, payload, attempts FROM frontier "
+                "WHERE kind = ? AND (status = ? OR (status = ? AND lease_expires < ?)) "
+                "ORDER BY priority DESC, rowid LIMIT ?",
+                (kind, PENDING, LEASED, now, limit)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE frontier SET status = ?, lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE kind = ? AND key = ?",
+                [(LEASED, worker_id, now + self.lease_seconds, now, row['kind'], row['key']) for row in rows]
+            )
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+
+        return [
+            {
+                'kind': row['kind'],
+                'key': row['key'],
+                'payload': json.loads(row['payload']) if row['payload'] else None,
+                'attempts': row['attempts'] + 1,
+            }
+            for row in rows
+        ]
+
+    def complete(self, kind: str, key: str, result=None):
+        self.conn.execute(
+            "UPDATE frontier SET status = ?, result = ?, error = NULL, lease_owner = NULL, "
+            "lease_expires = NULL, updated_at = ? WHERE kind = ? AND key = ?",
+            (DONE, json.dumps(result) if result is not None else None, time.time(), kind, key)
+        )
+
+    def fail(self, kind: str, key: str, error: str):
+        """Release a failed item for retry, or park it once attempts run out"""
+        self.conn.execute(
+            "UPDATE frontier SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE kind = ? AND key = ?",
+            (self.max_attempts, FAILED, PENDING, error, time.time(), kind, key)
+        )
+
+    def outstanding(self, kinds: Optional[Iterable[str]] = None) -> int:
+        """Number of items still pending or leased (optionally for some kinds)"""
+        query = "SELECT COUNT(*) FROM frontier WHERE status IN (?, ?)"
+        params = [PENDING, LEASED]
+        if kinds:
+            kinds = list(kinds)
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params += kinds
+        return self.conn.execute(query, params).fetchone()[0]
+
+    def items(self, kind: str) -> List[Dict]:
+        """All items of one kind with their payloads and results"""
+        rows = self.conn.execute(
+            "SELECT key, status, payload, result FROM frontier WHERE kind = ? ORDER BY rowid", (kind,)
+        ).fetchall()
+        return [
+            {
+                'key': row['key'],
+                'status': row['status'],
+                'payload': json.loads(row['payload']) if row['payload'] else None,
+                'result': json.loads(row['result']) if row['result'] else None,
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {}
+        for row in self.conn.execute("SELECT kind, status, COUNT(*) AS n FROM frontier GROUP BY kind, status"):
+            stats.setdefault(row['kind'], {})[row['status']] = row['n']
+        return stats
+
+    def reset(self):
+        """Forget all items so the next crawl starts from scratch"""
+        self.conn.execute("DELETE FROM frontier")
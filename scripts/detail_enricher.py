@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from normalize import fold
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_SELECTORS = [
+    '.field--name-body',
+    '.directory-description',
+    '.listing-description',
+    'article .content',
+]
+
+# The listing's own content, most specific first
+CONTENT_SELECTORS = ['main article', 'article', '[role="main"]', 'main'] + DESCRIPTION_SELECTORS
+# Page furniture inside the content node: menus, filters, ads, other listings
+NOISE_SELECTOR = (
+    'nav, aside, header, footer, form, script, style, article article, '
+    '[class*="related"], [class*="advert"], [class*="promo"], [id*="related"]'
+)
+
+AGE_RANGE_RE = re.compile(r'\bages?\s*(\d{1,2})\s*(?:-|–|to)\s*(\d{1,2})\b', re.IGNORECASE)
+AGE_MIN_RE = re.compile(r'\bages?\s*(\d{1,2})\s*(?:\+|and up|and older|or older)', re.IGNORECASE)
+PRICE_RE = re.compile(r'\$\s?(\d{1,5}(?:,\d{3})*(?:\.\d{2})?)')
+SCHEDULE_RE = re.compile(
+    r'\b((?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?'
+    r'(?:\s*(?:-|–|to|&|and|,)\s*(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?)*'
+    r',?\s*\d{1,2}(?::\d{2})?\s*(?:am|pm)?\s*(?:-|–|to)\s*\d{1,2}(?::\d{2})?\s*(?:am|pm))',
+    re.IGNORECASE
+)
+
+LOCATION_FIELDS = {
+    'streetAddress': 'address',
+    'addressLocality': 'city',
+    'addressRegion': 'state',
+    'postalCode': 'zip',
+}
+
+
+def _json_ld_items(soup: BeautifulSoup) -> List[Dict]:
+    items = []
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string or '')
+        except ValueError:
+            continue
+        if isinstance(data, dict) and '@graph' in data:
+            data = data['@graph']
+        items.extend(x for x in (data if isinstance(data, list) else [data]) if isinstance(x, dict))
+    return items
+
+
+def _content_text(soup: BeautifulSoup) -> str:
+    """Visible text of the listing's main content node, without page furniture"""
+    for selector in CONTENT_SELECTORS:
+        node = soup.select_one(selector)
+        if node and node.get_text(strip=True):
+            for noise in node.select(NOISE_SELECTOR):
+                noise.decompose()
+            return node.get_text(' ', strip=True)
+    return ''
+
+
+def parse_detail_page(html: str) -> Dict:
+    """Extract description, ages, schedules, prices and reviews from a listing page"""
+    soup = BeautifulSoup(html, 'html.parser')
+    details = {}
+
+    for item in _json_ld_items(soup):
+        description = item.get('description') or item.get('articleBody')
+        if description and not details.get('description'):
+            details['description'] = description.strip()
+
+        address = item.get('address') or (item.get('location') or {}).get('address')
+        if isinstance(address, dict):
+            for source, target in LOCATION_FIELDS.items():
+                if address.get(source):
+                    details.setdefault('location', {})[target] = address[source].strip()
+        if item.get('telephone'):
+            details.setdefault('location', {}).setdefault('phone', item['telephone'].strip())
+
+        if item.get('review'):
+            details.setdefault('reviews', []).extend(
+                item['review'] if isinstance(item['review'], list) else [item['review']]
+            )
+        if item.get('aggregateRating'):
+            details['rating'] = item['aggregateRating']
+
+        offers = item.get('offers')
+        for offer in (offers if isinstance(offers, list) else [offers] if offers else []):
+            if isinstance(offer, dict) and offer.get('price') not in (None, ''):
+                try:
+                    details.setdefault('prices', []).append(float(offer['price']))
+                except (TypeError, ValueError):
+                    pass
+
+        hours = item.get('openingHours')
+        if hours:
+            details.setdefault('schedules', []).extend(hours if isinstance(hours, list) else [hours])
+
+    if not details.get('description'):
+        for selector in DESCRIPTION_SELECTORS:
+            node = soup.select_one(selector)
+            if node and node.get_text(strip=True):
+                details['description'] = node.get_text(' ', strip=True)
+                break
+    if not details.get('description'):
+        meta = soup.find('meta', attrs={'property': 'og:description'}) or \
+            soup.find('meta', attrs={'name': 'description'})
+        if meta and meta.get('content'):
+            details['description'] = meta['content'].strip()
+
+    # Free-text facts (ages, prices, schedules) from the listing's own content only
+    text = _content_text(soup)
+
+    ages = [(int(lo), int(hi)) for lo, hi in AGE_RANGE_RE.findall(text)]
+    ages += [(int(lo), 18) for lo in AGE_MIN_RE.findall(text)]
+    if ages:
+        details['age_range'] = {
+            'min': min(lo for lo, _ in ages),
+            'max': max(hi for _, hi in ages),
+        }
+
+    prices = details.get('prices', []) + [float(p.replace(',', '')) for p in PRICE_RE.findall(text)]
+    if prices:
+        details['prices'] = sorted(set(prices))[:10]
+
+    schedules = details.get('schedules', []) + [m.strip() for m in SCHEDULE_RE.findall(text)]
+    if schedules:
+        details['schedules'] = list(dict.fromkeys(schedules))[:10]
+
+    return details
+
+
+def review_key(review) -> Tuple[str, str, str]:
+    """Identity of a review however its JSON was re-encoded: author, date and text"""
+    if not isinstance(review, dict):
+        return '', '', fold(str(review))
+    author = review.get('author')
+    if isinstance(author, dict):
+        author = author.get('name')
+    return (
+        fold(author if isinstance(author, str) else None),
+        str(review.get('datePublished') or '')[:10],
+        fold(review.get('reviewBody') or review.get('name')),
+    )
+
+
+def _review_list(reviews) -> List:
+    if not reviews:
+        return []
+    return list(reviews) if isinstance(reviews, list) else [reviews]
+
+
+def merge_details(activity: Dict, details: Dict) -> Dict:
+    """Merge detail-page data into a directory record without clobbering known values"""
+    # Directory cards carry a teaser; keep whichever description is fuller
+    if details.get('description') and len(details['description']) > len(activity.get('description') or ''):
+        activity['description'] = details['description']
+
+    location = activity.setdefault('location', {})
+    for key, value in (details.get('location') or {}).items():
+        if value and not location.get(key):
+            location[key] = value
+
+    for key in ('age_range', 'prices', 'schedules'):
+        if details.get(key):
+            activity[key] = details[key]
+
+    if details.get('reviews'):
+        merged = _review_list(activity.get('reviews'))
+        seen = {review_key(r) for r in merged}
+        for review in _review_list(details['reviews']):
+            key = review_key(review)
+            if key not in seen:
+                seen.add(key)
+                merged.append(review)
+        activity['reviews'] = merged
+    if details.get('rating') and not activity.get('rating'):
+        activity['rating'] = details['rating']
+
+    return activity
+
+
+class DetailEnricher:
+    """
+    Fetches a listing's own page and merges the extracted details into the
+    record in place. The crawler bounds how many run at once with
+    `concurrency`.
+    """
+
+    def __init__(self, fetcher, concurrency: int = 6):
+        self.fetcher = fetcher
+        self.concurrency = concurrency
+
+    async def enrich(self, activity: Dict) -> Optional[Dict]:
+        url = activity.get('url')
+        if not url:
+            return None
+        try:
+            html = await self.fetcher.fetch_text(url)
+            details = await asyncio.to_thread(parse_detail_page, html)
+            merge_details(activity, details)
+            return activity
+        except Exception as e:
+            logger.error(f"Error enriching {activity.get('name')}: {str(e)}")
+            return None
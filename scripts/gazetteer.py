@@ -0,0 +1,277 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+from normalize import fold
+
+BOROUGH = 'borough'
+NEIGHBORHOOD = 'neighborhood'
+
+ZIP_RE = re.compile(r'\b(\d{5})\b')
+WORD_START_RE = re.compile(r'(?:^|(?<=[^a-z0-9]))[a-z0-9]')
+# Aliases this short ("les", "si", "bk") are also ordinary words; inside longer
+# text they only count after a location cue or when written as an acronym
+SHORT_ALIAS_LEN = 3
+LOCATION_CUE_RE = re.compile(r'\b(?:in|near|from|around|at|by|of|to)\s+(?:the\s+)?$')
+ACRONYM_RE = re.compile(r'\b[A-Z]{2,%d}\b' % SHORT_ALIAS_LEN)
+
+BOROUGHS = ['Manhattan', 'Brooklyn', 'Queens', 'Bronx', 'Staten Island']
+
+# First three ZIP digits -> borough, for ZIPs not listed under a neighborhood
+ZIP_PREFIX_BOROUGH = {
+    '100': 'manhattan', '101': 'manhattan', '102': 'manhattan', '103': 'staten island',
+    '104': 'bronx', '110': 'queens', '111': 'queens', '112': 'brooklyn', '113': 'queens',
+    '114': 'queens', '116': 'queens',
+}
+
+# borough -> {neighborhood: ZIP codes}
+NEIGHBORHOODS = {
+    'manhattan': {
+        'Financial District': ['10004', '10005', '10006', '10038'],
+        'Battery Park City': ['10280', '10282'],
+        'Tribeca': ['10007', '10013'],
+        'SoHo': ['10012', '10013'],
+        'Chinatown': ['10013', '10002'],
+        'Lower East Side': ['10002'],
+        'East Village': ['10003', '10009'],
+        'Greenwich Village': ['10003', '10011', '10012'],
+        'West Village': ['10014'],
+        'Chelsea': ['10001', '10011'],
+        'Flatiron': ['10010'],
+        'Gramercy': ['10003', '10010'],
+        'Murray Hill': ['10016'],
+        'Midtown': ['10017', '10018', '10020', '10022', '10036'],
+        "Hell's Kitchen": ['10019', '10036'],
+        'Upper West Side': ['10023', '10024', '10025', '10069'],
+        'Upper East Side': ['10021', '10028', '10065', '10075', '10128'],
+        'Morningside Heights': ['10027'],
+        'Harlem': ['10026', '10027', '10030', '10037', '10039'],
+        'East Harlem': ['10029', '10035'],
+        'Washington Heights': ['10032', '10033', '10040'],
+        'Inwood': ['10034'],
+    },
+    'brooklyn': {
+        'Brooklyn Heights': ['11201'],
+        'DUMBO': ['11201'],
+        'Downtown Brooklyn': ['11201'],
+        'Cobble Hill': ['11201'],
+        'Carroll Gardens': ['11231'],
+        'Red Hook': ['11231'],
+        'Boerum Hill': ['11217'],
+        'Park Slope': ['11215', '11217'],
+        'Gowanus': ['11215', '11217'],
+        'Prospect Heights': ['11238'],
+        'Fort Greene': ['11205', '11217'],
+        'Clinton Hill': ['11205', '11238'],
+        'Windsor Terrace': ['11218'],
+        'Kensington': ['11218'],
+        'Sunset Park': ['11220', '11232'],
+        'Bay Ridge': ['11209'],
+        'Dyker Heights': ['11228'],
+        'Bensonhurst': ['11214'],
+        'Borough Park': ['11219'],
+        'Williamsburg': ['11211', '11206', '11249'],
+        'Greenpoint': ['11222'],
+        'Bushwick': ['11221', '11237'],
+        'Bedford-Stuyvesant': ['11216', '11221', '11233'],
+        'Crown Heights': ['11213', '11216', '11225'],
+        'Prospect Lefferts Gardens': ['11225'],
+        'Flatbush': ['11226'],
+        'Ditmas Park': ['11226'],
+        'Midwood': ['11230'],
+        'Sheepshead Bay': ['11229', '11235'],
+        'Brighton Beach': ['11235'],
+        'Coney Island': ['11224'],
+    },
+    'queens': {
+        'Long Island City': ['11101', '11109'],
+        'Astoria': ['11102', '11103', '11105', '11106'],
+        'Sunnyside': ['11104'],
+        'Woodside': ['11377'],
+        'Jackson Heights': ['11372'],
+        'Elmhurst': ['11373'],
+        'Rego Park': ['11374'],
+        'Forest Hills': ['11375'],
+        'Kew Gardens': ['11415'],
+        'Ridgewood': ['11385'],
+        'Flushing': ['11354', '11355'],
+        'Bayside': ['11360', '11361'],
+        'Jamaica': ['11432', '11433', '11434', '11435'],
+    },
+    'bronx': {
+        'Riverdale': ['10463', '10471'],
+        'Kingsbridge': ['10463'],
+        'Fordham': ['10458'],
+        'Mott Haven': ['10454'],
+        'Morris Park': ['10462'],
+        'Pelham Bay': ['10461'],
+    },
+    'staten island': {
+        'St. George': ['10301'],
+        'Great Kills': ['10308'],
+        'Tottenville': ['10307'],
+    },
+}
+
+# Alternate spellings and local shorthand -> canonical area name
+ALIASES = {
+    'bk': 'brooklyn', 'bklyn': 'brooklyn', 'brooklyn ny': 'brooklyn', 'kings county': 'brooklyn',
+    'new york': 'manhattan', 'new york ny': 'manhattan', 'the city': 'manhattan',
+    'new york city': 'manhattan', 'nyc': 'manhattan', 'ny': 'manhattan', 'nyc ny': 'manhattan',
+    'manhattan ny': 'manhattan', 'queens ny': 'queens', 'bronx ny': 'bronx',
+    'qns': 'queens', 'the bronx': 'bronx', 'bx': 'bronx', 'si': 'staten island', 'staten': 'staten island',
+    'fidi': 'financial district', 'bpc': 'battery park city', 'les': 'lower east side',
+    'the village': 'greenwich village', 'noho': 'east village', 'flatiron district': 'flatiron',
+    'gramercy park': 'gramercy', 'hells kitchen': "hell's kitchen", 'clinton': "hell's kitchen",
+    'midtown manhattan': 'midtown', 'times square': 'midtown', 'uws': 'upper west side',
+    'ues': 'upper east side', 'yorkville': 'upper east side', 'carnegie hill': 'upper east side',
+    'spanish harlem': 'east harlem', 'el barrio': 'east harlem', 'wash heights': 'washington heights',
+    'dumbo': 'dumbo', 'downtown bk': 'downtown brooklyn', 'bed stuy': 'bedford-stuyvesant',
+    'bedstuy': 'bedford-stuyvesant', 'bed-stuy': 'bedford-stuyvesant', 'wburg': 'williamsburg',
+    'williamsburgh': 'williamsburg', 'the slope': 'park slope', 'south slope': 'park slope',
+    'plg': 'prospect lefferts gardens', 'boro park': 'borough park', 'lic': 'long island city',
+    'kew gardens hills': 'kew gardens', 'st george': 'st. george', 'saint george': 'st. george',
+}
+
+
+@dataclass(frozen=True)
+class Area:
+    key: str
+    name: str
+    kind: str
+    borough: str
+    zips: FrozenSet[str]
+
+
+class _TrieNode:
+    __slots__ = ('children', 'area')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.area: Optional[str] = None
+
+
+class Gazetteer:
+    """
+    NYC boroughs, neighborhoods, ZIP codes and aliases compiled into a
+    character trie. `resolve` maps free text ("Park Slope", "BK", "11215",
+    "we're near prospect park in the slope") to a canonical Area whose key is
+    the same key the catalog indexes listings under.
+    """
+
+    def __init__(self, neighborhoods: Dict[str, Dict[str, List[str]]] = NEIGHBORHOODS,
+                 aliases: Dict[str, str] = ALIASES):
+        self.areas: Dict[str, Area] = {}
+        self.by_zip: Dict[str, List[str]] = {}
+        self.root = _TrieNode()
+
+        for borough in BOROUGHS:
+            key = fold(borough)
+            zips = frozenset(z for hood in neighborhoods.get(key, {}).values() for z in hood)
+            self.areas[key] = Area(key, borough, BOROUGH, key, zips)
+        for borough, hoods in neighborhoods.items():
+            for name, zips in hoods.items():
+                key = fold(name)
+                self.areas[key] = Area(key, name, NEIGHBORHOOD, borough, frozenset(zips))
+                for zip_code in zips:
+                    self.by_zip.setdefault(zip_code, []).append(key)
+
+        for key in self.areas:
+            self._insert(key, key)
+        for alias, target in aliases.items():
+            self._insert(fold(alias), fold(target))
+
+    def _insert(self, text: str, area_key: str):
+        node = self.root
+        for char in text:
+            node = node.children.setdefault(char, _TrieNode())
+        node.area = area_key
+
+    def _node(self, text: str) -> Optional[_TrieNode]:
+        node = self.root
+        for char in text:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def lookup(self, text: Optional[str]) -> Optional[Area]:
+        """Exact name or alias match"""
+        node = self._node(fold(text))
+        return self.areas[node.area] if node and node.area else None
+
+    def complete(self, prefix: Optional[str], limit: int = 10) -> List[Area]:
+        """Areas whose name or alias starts with `prefix`"""
+        node = self._node(fold(prefix))
+        found: List[str] = []
+        stack = [node] if node else []
+        while stack and len(found) < limit:
+            node = stack.pop()
+            if node.area and node.area not in found:
+                found.append(node.area)
+            stack.extend(node.children[c] for c in sorted(node.children, reverse=True))
+        return [self.areas[key] for key in found]
+
+    def for_zip(self, zip_code: Optional[str]) -> Optional[Area]:
+        if not zip_code:
+            return None
+        keys = self.by_zip.get(zip_code)
+        if keys:
+            return self.areas[keys[0]]
+        borough = ZIP_PREFIX_BOROUGH.get(zip_code[:3])
+        return self.areas[borough] if borough else None
+
+    def _scan(self, text: str, acronyms: FrozenSet[str] = frozenset()) -> List[Area]:
+        """Longest name/alias match starting at each word boundary"""
+        matches = []
+        for start in (m.start() for m in WORD_START_RE.finditer(text)):
+            node, best = self.root, None
+            for end in range(start, len(text)):
+                node = node.children.get(text[end])
+                if node is None:
+                    break
+                if node.area and (end + 1 == len(text) or not text[end + 1].isalnum()):
+                    word = text[start:end + 1]
+                    # "Les Miserables" is not the Lower East Side; "in the LES" is
+                    if (len(word) > SHORT_ALIAS_LEN or word in acronyms
+                            or LOCATION_CUE_RE.search(text, 0, start)):
+                        best = node.area
+            if best:
+                matches.append(self.areas[best])
+        return matches
+
+    def resolve(self, text: Optional[str]) -> Optional[Area]:
+        """Most specific area mentioned in free text, or None"""
+        acronyms = frozenset(fold(word) for word in ACRONYM_RE.findall(text or ''))
+        text = fold(text)
+        if not text:
+            return None
+
+        zip_match = ZIP_RE.search(text)
+        if zip_match and self.for_zip(zip_match.group(1)):
+            return self.for_zip(zip_match.group(1))
+
+        exact = self.lookup(text)
+        if exact:
+            return exact
+
+        matches = self._scan(text, acronyms)
+        if matches:
+            # "Park Slope, Brooklyn" -> the neighborhood, not the borough
+            return next((a for a in matches if a.kind == NEIGHBORHOOD), matches[0])
+
+        # A partly typed name that can only mean one area ("williamsb")
+        completions = self.complete(text, limit=2)
+        return completions[0] if len(completions) == 1 else None
+
+    def area_keys(self, city: Optional[str], zip_code: Optional[str]) -> FrozenSet[str]:
+        """Every area a listing belongs to: its neighborhoods and borough"""
+        keys = set(self.by_zip.get(zip_code or '', []))
+        area = self.for_zip(zip_code) or self.resolve(city)
+        if area:
+            keys.update((area.key, area.borough))
+        keys.update(self.areas[key].borough for key in list(keys))
+        return frozenset(keys)
+
+
+GAZETTEER = Gazetteer()
@@ -0,0 +1,415 @@
+import argparse
+import functools
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import Future, InvalidStateError
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait as wait_for_results
+from typing import Any, Dict, Optional, Tuple
+
+from catalog_store import CatalogStore
+from schemas import decode_request, encode, request_id
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# ConversationHandler methods that may be dispatched to a worker
+ALLOWED_METHODS = {
+    'handle_conversation',
+    'generate_recommendations',
+    'refine_recommendations',
+}
+# Methods served by the parent's own handler: bookmarks live in one process,
+# so every session sees the same in-memory index and one writer owns the file
+OWNER_METHODS = {
+    'handle_bookmark',
+    'is_bookmarked',
+}
+
+
+class PoolOverloaded(Exception):
+    """Raised when the target worker's queue is full (backpressure)"""
+
+
+class RequestTimeout(Exception):
+    """Raised when a worker did not answer within the request timeout"""
+
+
+class WorkerCrashed(Exception):
+    """Raised for requests that were in flight on a worker that died"""
+
+
+class PoolClosed(Exception):
+    """Raised for requests submitted to, or still unanswered by, a closed pool"""
+
+
+# Messages a worker sends back for each request
+STARTED, DONE, FAILED = 'started', 'done', 'failed'
+
+
+@dataclass
+class _Request:
+    """A request the parent is waiting on"""
+    index: int
+    future: Future
+    method: str
+    args: Tuple
+    timeout: float
+    queued: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+    timed_out: bool = False
+
+
+def _worker_main(index: int, requests, results, catalog):
+    """Worker process: one ConversationHandler serving requests from its own queue"""
+    from conversation_handler import ConversationHandler
+
+    # stdout belongs to the parent's line protocol; keep handler debug output off it
+    sys.stdout = sys.stderr
+    handler = ConversationHandler(catalog=catalog)
+    try:
+        while True:
+            item = requests.get()
+            if item is None:
+                break
+            request_id, method, args = item
+            # The parent's timeout clock starts here, not when the request was queued
+            results.send((request_id, STARTED, None))
+            try:
+                results.send((request_id, DONE, getattr(handler, method)(*args)))
+            except Exception as e:
+                results.send((request_id, FAILED, f"{type(e).__name__}: {str(e)}"))
+    finally:
+        handler.close()
+        results.close()
+
+
+class HandlerPool:
+    """
+    Runs N ConversationHandler worker processes behind a dispatcher.
+
+    - The catalog is loaded once in the parent and handed to each worker,
+      instead of every worker parsing the catalog file.
+    - Workers are started with spawn/forkserver, never fork: the parent runs
+      threads (the collector, callers), and a forked child could inherit a
+      lock one of them was holding.
+    - Requests for the same session always go to the same worker, so its
+      candidate pools and caches stay warm for that conversation.
+    - Each worker accepts at most `max_queue_depth` outstanding requests;
+      beyond that submit() raises PoolOverloaded instead of queueing forever.
+    - A request's `timeout` runs from when its worker picks it up, so time
+      spent queued behind other requests doesn't count. Only that request
+      fails with RequestTimeout; its worker is killed and replaced only if it
+      is still busy with it `grace` seconds later, and the requests queued
+      behind it are handed to the replacement instead of failed.
+    - Bookmark methods run on a handler in the parent process, which owns the
+      bookmark store for every session.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue_depth: int = 32, timeout: float = 10.0,
+                 grace: Optional[float] = None):
+        self.num_workers = workers or os.cpu_count() or 1
+        self.max_queue_depth = max_queue_depth
+        self.timeout = timeout
+        self.grace = timeout if grace is None else grace
+        methods = mp.get_all_start_methods()
+        self.ctx = mp.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self.catalog = CatalogStore().load()
+
+        # One request queue and one result pipe per worker, replaced together on restart
+        self.request_queues = [None] * self.num_workers
+        self.results = [None] * self.num_workers
+        self.processes = [None] * self.num_workers
+        self.depth = [0] * self.num_workers
+        # When each worker last sent anything, to tell an idle worker from a stuck one
+        self.heard = [0.0] * self.num_workers
+        self._pending: Dict[int, _Request] = {}
+        self._ids = itertools.count()
+        # Guards the pending table, depths and queue swaps; submit() holds it while enqueueing
+        self._lock = threading.Lock()
+        self._owner = None
+        self._owner_lock = threading.Lock()
+        self._collector = None
+        self._closed = False
+
+    def start(self):
+        with self._lock:
+            for index in range(self.num_workers):
+                self._spawn(index)
+        self._collector = threading.Thread(target=self._collect, name='pool-collector', daemon=True)
+        self._collector.start()
+        logger.info(f"Started {self.num_workers} conversation workers")
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _spawn(self, index: int):
+        """Start worker `index` with a fresh request queue and result pipe (caller holds _lock)"""
+        requests = self.ctx.Queue()
+        reader, writer = self.ctx.Pipe(duplex=False)
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(index, requests, writer, self.catalog),
+            name=f"conversation-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        # Only the worker holds the write end, so the reader sees EOF when it dies
+        writer.close()
+        self.request_queues[index] = requests
+        self.results[index] = reader
+        self.processes[index] = process
+        self.heard[index] = time.monotonic()
+
+    def worker_for(self, session_id: str) -> int:
+        """Stable session -> worker mapping (crc32, unlike hash(), is not salted per process)"""
+        return zlib.crc32(str(session_id).encode('utf-8')) % self.num_workers
+
+    @property
+    def owner(self):
+        """The parent's handler, created on the first bookmark request"""
+        with self._owner_lock:
+            if self._owner is None:
+                from conversation_handler import ConversationHandler
+                self._owner = ConversationHandler(catalog=self.catalog)
+            return self._owner
+
+    def submit(self, session_id: str, method: str, *args, timeout: Optional[float] = None) -> Future:
+        if method in OWNER_METHODS:
+            future = Future()
+            try:
+                future.set_result(getattr(self.owner, method)(*args))
+            except Exception as e:
+                future.set_exception(RuntimeError(f"{type(e).__name__}: {str(e)}"))
+            return future
+        if method not in ALLOWED_METHODS:
+            raise ValueError(f"Method not allowed: {method}")
+        index = self.worker_for(session_id)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise PoolClosed("The handler pool is closed")
+            if self.depth[index] >= self.max_queue_depth:
+                raise PoolOverloaded(f"Worker {index} has {self.depth[index]} requests queued")
+            request_id = next(self._ids)
+            self.depth[index] += 1
+            self._pending[request_id] = _Request(index, future, method, args,
+                                                 self.timeout if timeout is None else timeout)
+            # Under the lock, so a restart can't swap the queue out from under us
+            self.request_queues[index].put((request_id, method, args))
+        return future
+
+    def call(self, session_id: str, method: str, *args, timeout: Optional[float] = None) -> Any:
+        # The collector resolves every request: answered, timed out, or lost with its worker
+        return self.submit(session_id, method, *args, timeout=timeout).result()
+
+    def handle_conversation(self, session_id: str, user_input: str, current_state: str,
+                            user_data: Dict, timeout: Optional[float] = None) -> Dict:
+        return self.call(session_id, 'handle_conversation', user_input, current_state, user_data,
+                         timeout=timeout)
+
+    def _collect(self):
+        last_check = time.monotonic()
+        while not self._closed:
+            with self._lock:
+                readers = {reader: index for index, reader in enumerate(self.results)}
+            for reader in wait_for_results(list(readers), timeout=0.1):
+                try:
+                    request_id, kind, value = reader.recv()
+                except (EOFError, OSError):
+                    if not self._closed:
+                        index = readers[reader]
+                        logger.error(f"Worker {index} exited with code {self.processes[index].exitcode}; restarting")
+                        self._restart(index)
+                    continue
+                self.heard[readers[reader]] = time.monotonic()
+                self._received(request_id, kind, value)
+            self._check_timeouts()
+            if time.monotonic() - last_check > 0.5:
+                self._check_workers()
+                last_check = time.monotonic()
+
+    def _received(self, request_id: int, kind: str, value: Any):
+        with self._lock:
+            request = self._pending.get(request_id)
+            if request is None:
+                return
+            if kind == STARTED:
+                request.started = time.monotonic()
+                return
+            del self._pending[request_id]
+            self.depth[request.index] -= 1
+        try:
+            if kind == DONE:
+                request.future.set_result(value)
+            else:
+                request.future.set_exception(RuntimeError(value))
+        except InvalidStateError:
+            pass  # already failed with RequestTimeout
+
+    def _check_timeouts(self):
+        """Fail requests that ran past their timeout; replace workers that are stuck"""
+        now = time.monotonic()
+        expired, stuck = [], set()
+        with self._lock:
+            waiting_since = {}
+            for request in self._pending.values():
+                if request.started is None:
+                    waiting_since[request.index] = min(request.queued, waiting_since.get(request.index, now))
+                    continue
+                running = now - request.started
+                if not request.timed_out and running > request.timeout:
+                    # Stays pending (and counted in depth) until the worker answers or is replaced
+                    request.timed_out = True
+                    expired.append(request)
+                elif request.timed_out and running > request.timeout + self.grace:
+                    stuck.add(request.index)
+            busy = {request.index for request in self._pending.values() if request.started is not None}
+            for index, since in waiting_since.items():
+                # Work is queued but the worker hasn't picked any of it up or said anything since
+                if index not in busy and now - max(since, self.heard[index]) > self.grace:
+                    stuck.add(index)
+        for request in expired:
+            try:
+                request.future.set_exception(
+                    RequestTimeout(f"{request.method} got no answer within {request.timeout}s"))
+            except InvalidStateError:
+                pass
+        for index in stuck:
+            if not self._closed:
+                logger.error(f"Worker {index} is stuck; restarting")
+                self._restart(index)
+
+    def _check_workers(self):
+        """Replace any worker that died"""
+        for index, process in enumerate(self.processes):
+            if not self._closed and not process.is_alive():
+                logger.error(f"Worker {index} exited with code {process.exitcode}; restarting")
+                self._restart(index)
+
+    def _restart(self, index: int):
+        """
+        Stop a worker if it is still running and start a fresh one. The request
+        it was working on fails with WorkerCrashed; requests it had not picked up
+        yet are handed to the replacement. Only called from the collector thread.
+        """
+        process = self.processes[index]
+        if process.is_alive():
+            process.kill()
+        process.join(timeout=5)
+        with self._lock:
+            lost = []
+            waiting = []
+            for request_id, request in list(self._pending.items()):
+                if request.index != index:
+                    continue
+                if request.started is None:
+                    waiting.append((request_id, request))
+                else:
+                    lost.append(self._pending.pop(request_id))
+            self.results[index].close()
+            self._spawn(index)
+            for request_id, request in sorted(waiting, key=lambda item: item[0]):
+                self.request_queues[index].put((request_id, request.method, request.args))
+            self.depth[index] = len(waiting)
+        for request in lost:
+            try:
+                request.future.set_exception(WorkerCrashed(f"Worker {index} died"))
+            except InvalidStateError:
+                pass
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._collector:
+            self._collector.join(timeout=1)
+        for requests in self.request_queues:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        with self._lock:
+            unanswered = list(self._pending.values())
+            self._pending.clear()
+        for request in unanswered:
+            try:
+                request.future.set_exception(PoolClosed("The handler pool closed before answering"))
+            except InvalidStateError:
+                pass
+        if self._owner is not None:
+            self._owner.close()
+
+
+def serve(pool: HandlerPool, stdin=sys.stdin, stdout=sys.stdout):
+    """
+    Line-delimited JSON front end for the Node server: each input line is
+    {"id", "sessionId", "userInput", "currentState", "userData"} and each output
+    line is {"id", "result"} or {"id", "error"}, in completion order.
+    """
+    write_lock = threading.Lock()
+    # Requests not yet answered; at EOF they are drained before returning
+    outstanding = set()
+    answered = threading.Condition()
+
+    def reply(message):
+        with write_lock:
+            stdout.write(encode(message).decode('utf-8') + '\n')
+            stdout.flush()
+
+    def on_done(request_id, future):
+        try:
+            reply({'id': request_id, 'result': future.result()})
+        except Exception as e:
+            reply({'id': request_id, 'error': f"{type(e).__name__}: {str(e)}"})
+        with answered:
+            outstanding.discard(future)
+            answered.notify_all()
+
+    for line in stdin:
+        if not line.strip():
+            continue
+        request = None
+        try:
+            # Validates the request shape (and userData) while parsing
+            request = decode_request(line)
+            future = pool.submit(
+                request.get('sessionId', ''), 'handle_conversation',
+                request['userInput'], request['currentState'], request.get('userData', {})
+            )
+        except Exception as e:
+            reply({'id': request.get('id') if isinstance(request, dict) else request_id(line),
+                   'error': f"{type(e).__name__}: {str(e)}"})
+            continue
+
+        with answered:
+            outstanding.add(future)
+        future.add_done_callback(functools.partial(on_done, request.get('id')))
+
+    # stdin closed: every request still in flight gets its line before the pool shuts down
+    with answered:
+        answered.wait_for(lambda: not outstanding)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve conversation turns from a pool of handler workers")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument('--queue-depth', type=int, default=32, help="max outstanding requests per worker")
+    parser.add_argument('--timeout', type=float, default=10.0, help="per-request timeout in seconds")
+    args = parser.parse_args()
+
+    with HandlerPool(args.workers, args.queue_depth, args.timeout) as handler_pool:
+        serve(handler_pool)
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import random
+import time
+import urllib.parse
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import aiohttp
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = THROTTLE_STATUSES | {500, 502, 504}
+
+
+class FetchError(Exception):
+    """Raised when a URL could not be fetched after all retries"""
+
+    def __init__(self, url: str, status: Optional[int] = None, message: str = ''):
+        self.url = url
+        self.status = status
+        super().__init__(message or f"Failed to fetch {url} (status {status})")
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    body: bytes
+    headers: Dict[str, str]
+    latency: float
+
+    @property
+    def text(self) -> str:
+        return self.body.decode('utf-8', errors='replace')
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class DomainLimiter:
+    """
+    Flow control for a single host: a token bucket caps the request rate and an
+    AIMD window caps concurrency. Fast successful responses grow the window
+    additively; slow responses and 429/503 shrink it multiplicatively.
+    """
+
+    def __init__(self, rate: float = 4.0, burst: int = 4, initial_concurrency: int = 2,
+                 min_concurrency: int = 1, max_concurrency: int = 16,
+                 target_latency: float = 2.0, min_rate: float = 0.2, max_rate: float = 20.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.concurrency = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._last_refill = time.monotonic()
+        self._cond = asyncio.Condition()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def acquire(self):
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    delay = None
+                elif self.tokens < 1:
+                    delay = (1 - self.tokens) / self.rate
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, latency: Optional[float], status: Optional[int],
+                      retry_after: Optional[float] = None):
+        async with self._cond:
+            self.in_flight -= 1
+            if status in THROTTLE_STATUSES:
+                self._decrease()
+                pause = retry_after if retry_after is not None else 1.0 / self.rate
+                self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            elif status is None or status >= 500:
+                self._decrease()
+            elif latency is not None and latency > self.target_latency:
+                self.concurrency = max(self.min_concurrency, self.concurrency * 0.9)
+            else:
+                # Additive increase: roughly +1 slot per window of successes
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+                self.rate = min(self.max_rate, self.rate + 0.1)
+            self._cond.notify_all()
+
+    def _decrease(self):
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+        self.rate = max(self.min_rate, self.rate / 2)
+
+
+class AdaptiveFetcher:
+    """
+    Shared async HTTP layer for the scraper: one pooled keep-alive session and
+    a DomainLimiter per host (e.g. mommypoppins.com and static.mommypoppins.com
+    are throttled independently).
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, timeout: float = 10,
+                 max_retries: int = 3, connections_per_host: int = 16,
+                 limiter_options: Optional[Dict] = None):
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.connections_per_host = connections_per_host
+        self.limiter_options = limiter_options or {}
+        self.limiters: Dict[str, DomainLimiter] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.connections_per_host,
+                ttl_dns_cache=300,
+            )
+            self.session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def limiter_for(self, url: str) -> DomainLimiter:
+        host = urllib.parse.urlsplit(url).hostname or ''
+        limiter = self.limiters.get(host)
+        if limiter is None:
+            limiter = self.limiters[host] = DomainLimiter(**self.limiter_options)
+        return limiter
+
+    async def get(self, url: str) -> FetchResult:
+        """GET a URL through the host's limiter, retrying throttles and transient errors"""
+        await self.open()
+        limiter = self.limiter_for(url)
+        last_status = None
+
+        for attempt in range(self.max_retries):
+            await limiter.acquire()
+            start = time.monotonic()
+            status = None
+            retry_after = None
+            released = False
+            try:
+                async with self.session.get(url) as response:
+                    status = response.status
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    body = await response.read()
+                    latency = time.monotonic() - start
+                    released = True
+                    await limiter.release(latency, status, retry_after)
+
+                    if status < 400:
+                        return FetchResult(url, status, body, dict(response.headers), latency)
+                    if status not in RETRY_STATUSES:
+                        raise FetchError(url, status)
+                    last_status = status
+                    logger.warning(f"Attempt {attempt + 1} for {url} got HTTP {status}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not released:
+                    await limiter.release(None, None)
+                logger.error(f"Attempt {attempt + 1} failed: {str(e)}")
+
+            if attempt < self.max_retries - 1 and retry_after is None:
+                # The limiter already pauses the host for Retry-After; otherwise back off
+                await asyncio.sleep(2 ** attempt + random.random())
+
+        raise FetchError(url, last_status)
+
+    async def fetch_text(self, url: str) -> str:
+        return (await self.get(url)).text
+
+    async def fetch_bytes(self, url: str) -> bytes:
+        return (await self.get(url)).body
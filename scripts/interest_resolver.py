@@ -0,0 +1,160 @@
+import re
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from normalize import fold, stem, token_set
+
+WORD_RE = re.compile(r"[a-z]+")
+
+# Canonical activity categories and the free-text terms parents use for them
+CATEGORY_SYNONYMS = {
+    'sports': ['sports', 'sport', 'soccer', 'football', 'basketball', 'baseball', 'softball',
+               'tennis', 'volleyball', 'hockey', 'lacrosse', 'golf', 'track', 'running',
+               'athletics', 'athletic', 'fencing', 'climbing', 'skating', 'skateboarding'],
+    'dance': ['dance', 'dancing', 'ballet', 'tap', 'jazz dance', 'hip hop', 'hiphop',
+              'ballroom', 'salsa', 'choreography', 'modern dance'],
+    'music': ['music', 'musical', 'piano', 'guitar', 'violin', 'cello', 'drums', 'singing',
+              'voice', 'choir', 'chorus', 'band', 'orchestra', 'ukulele', 'songwriting'],
+    'art': ['art', 'arts', 'painting', 'drawing', 'sculpture', 'pottery', 'ceramics', 'crafts',
+            'craft', 'design', 'fashion', 'photography', 'illustration', 'sewing'],
+    'theater': ['theater', 'theatre', 'acting', 'drama', 'improv', 'comedy', 'musical theater',
+                'broadway', 'performing arts', 'puppetry'],
+    'film': ['film', 'filmmaking', 'movies', 'movie', 'animation', 'video', 'cinema'],
+    'stem': ['stem', 'science', 'coding', 'programming', 'computers', 'robotics', 'robots',
+             'engineering', 'math', 'technology', 'lego', 'minecraft', 'chemistry', 'architecture'],
+    'martial arts': ['martial arts', 'karate', 'taekwondo', 'judo', 'jiu jitsu', 'kung fu',
+                     'boxing', 'self defense', 'dojo'],
+    'swimming': ['swimming', 'swim', 'swimmers', 'diving', 'aquatics', 'water polo'],
+    'gymnastics': ['gymnastics', 'gym', 'tumbling', 'acrobatics', 'circus', 'trampoline', 'parkour'],
+    'cooking': ['cooking', 'cook', 'baking', 'chef', 'culinary', 'kitchen'],
+    'academics': ['tutoring', 'reading', 'writing', 'language', 'spanish', 'french', 'chinese',
+                  'mandarin', 'chess', 'debate', 'homework', 'test prep', 'learning'],
+    'camps': ['camp', 'camps', 'summer camp', 'day camp'],
+    'play': ['play', 'playground', 'games', 'dungeons', 'dragons', 'playgroup'],
+}
+
+# Stemmed token sets per category term, used to tag catalog activities
+CATEGORY_TERMS = {
+    category: [token_set(term) for term in terms]
+    for category, terms in CATEGORY_SYNONYMS.items()
+}
+PHRASE_CATEGORY = {
+    fold(term): category
+    for category, terms in CATEGORY_SYNONYMS.items()
+    for term in terms
+}
+
+
+def categorize(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    """Categories whose synonym terms all appear in an activity's stemmed tokens"""
+    return frozenset(
+        category
+        for category, term_sets in CATEGORY_TERMS.items()
+        if any(terms and terms <= tokens for terms in term_sets)
+    )
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """All strings reachable from `word` by deleting up to max_distance characters"""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w)) if len(w) > 1}
+        results |= frontier
+    return results
+
+
+def _osa_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (Levenshtein + adjacent transpositions)"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+def max_distance_for(word: str) -> int:
+    # Short words sit within an edit or two of many real words ("sing"/"king")
+    return 0 if len(word) <= 3 else 1 if len(word) <= 7 else 2
+
+
+class InterestResolver:
+    """
+    Maps free-text interests ("balet", "soccor", "hip hop") to a corrected
+    term and a canonical category.
+
+    Spelling correction uses a symmetric-delete (SymSpell) index: every
+    category term word is stored under all of its deletions within the edit
+    budget, so a lookup only generates the query's own deletions and checks
+    a handful of candidates instead of scanning the terms. Only category
+    terms are correction targets; words the catalog itself uses are taken
+    as real words and kept, as is anything with no term close enough
+    ("horse riding" stays "horse riding", not "house writing").
+    """
+
+    def __init__(self, vocabulary: Iterable[str] = (), max_distance: int = 2):
+        self.max_distance = max_distance
+        self.frequency = Counter()
+        for term in CATEGORY_SYNONYMS.values():
+            for phrase in term:
+                self.frequency.update(WORD_RE.findall(phrase) * 100)
+        self.frequency.update(w for w in vocabulary if len(w) > 2)
+
+        self.terms = {word for terms in CATEGORY_SYNONYMS.values() for phrase in terms
+                      for word in WORD_RE.findall(phrase)}
+        self.deletes: Dict[str, Set[str]] = {}
+        for word in self.terms:
+            for variant in _deletes(word, min(self.max_distance, max_distance_for(word))):
+                self.deletes.setdefault(variant, set()).add(word)
+
+    def correct_word(self, word: str) -> str:
+        if word in self.frequency:
+            return word
+        budget = min(self.max_distance, max_distance_for(word))
+        if not budget:
+            return word
+        candidates = set()
+        for variant in _deletes(word, budget):
+            candidates |= self.deletes.get(variant, set())
+
+        best, best_key = word, None
+        for candidate in candidates:
+            distance = _osa_distance(word, candidate, budget)
+            if distance > budget:
+                continue
+            key = (distance, -self.frequency[candidate])
+            if best_key is None or key < best_key:
+                best, best_key = candidate, key
+        return best
+
+    def resolve(self, interest: str) -> Dict[str, Optional[str]]:
+        """{'term': corrected text, 'category': canonical category or None}"""
+        phrase = fold(interest)
+        if phrase in PHRASE_CATEGORY:
+            return {'term': phrase, 'category': PHRASE_CATEGORY[phrase]}
+
+        words = [self.correct_word(w) for w in WORD_RE.findall(phrase)]
+        term = ' '.join(words)
+        category = PHRASE_CATEGORY.get(term)
+        if category is None:
+            # Fall back to the first word that names a category ("soccor lessons")
+            category = next((PHRASE_CATEGORY[w] for w in words if w in PHRASE_CATEGORY), None)
+        if category is None:
+            stems = {stem(w) for w in words}
+            category = next(
+                (c for c, term_sets in CATEGORY_TERMS.items()
+                 if any(terms and terms <= stems for terms in term_sets)),
+                None
+            )
+        return {'term': term, 'category': category}
+
+    def resolve_all(self, interests: Iterable[str]) -> List[Dict[str, Optional[str]]]:
+        return [r for r in map(self.resolve, interests) if r['term']]
@@ -3,6 +3,8 @@ import json
 import logging
 from pathlib import Path
 
+from review_aggregates import summarize_activity_reviews
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -31,19 +33,26 @@ def flatten_location(location):
         'phone': location.get('phone')
     }
 
-def flatten_reviews(reviews):
-    """Convert reviews list to a string summary"""
-    if not reviews:
-        return None
-        
-    review_texts = []
-    for review in reviews:
-        author = review.get('author', {}).get('name', 'Anonymous')
-        rating = review.get('reviewRating', {}).get('ratingValue', 'N/A')
-        text = review.get('reviewBody', '').strip()
-        review_texts.append(f"{author} ({rating}/5): {text}")
-    
-    return ' | '.join(review_texts)
+def flatten_review_summary(activity):
+    """Review columns from the precomputed review_summary"""
+    summary = activity.get('review_summary')
+    if summary is None and activity.get('reviews'):
+        # Catalogs published before review aggregation carry only raw reviews
+        summary = summarize_activity_reviews(activity)
+    if not summary:
+        return {
+            'review_count': None,
+            'average_rating': None,
+            'smoothed_rating': None,
+            'review_keywords': None
+        }
+
+    return {
+        'review_count': summary.get('count'),
+        'average_rating': summary.get('mean'),
+        'smoothed_rating': summary.get('bayesian'),
+        'review_keywords': ', '.join(summary.get('top_keywords') or []) or None
+    }
 
 def json_to_excel(json_file='activities_data.json', output_dir='data'):
     """Convert activities JSON data to Excel format"""
@@ -83,8 +92,8 @@ def json_to_excel(json_file='activities_data.json', output_dir='data'):
             # Flatten location data
             location_data = flatten_location(activity.get('location'))
             
-            # Process reviews
-            reviews_text = flatten_reviews(activity.get('reviews'))
+            # Review aggregates (computed at ingest)
+            review_data = flatten_review_summary(activity)
             
             # Create flattened record
             record = {
@@ -101,7 +110,10 @@ def json_to_excel(json_file='activities_data.json', output_dir='data'):
                 'State': location_data['state'],
                 'ZIP': location_data['zip'],
                 'Phone': location_data['phone'],
-                'Reviews': reviews_text,
+                'Review Count': review_data['review_count'],
+                'Average Rating': review_data['average_rating'],
+                'Smoothed Rating': review_data['smoothed_rating'],
+                'Review Keywords': review_data['review_keywords'],
                 'Rating': activity.get('rating', {}).get('ratingValue') if activity.get('rating') else None
             }
             processed_data.append(record)
@@ -0,0 +1,228 @@
+import argparse
+import logging
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+from conversation_handler import TROUBLE_MESSAGE
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LOCATIONS = ['Brooklyn', 'New York', 'Manhattan', 'Queens', 'Park Slope', 'Upper West Side', '11215', 'Bronx']
+NAMES = ['Mia', 'Liam', 'Olivia', 'Noah', 'Emma', 'Lucas', 'Ava', 'Leo', 'Sofia', 'Ethan']
+INTERESTS = ['soccer', 'art', 'music', 'dance', 'ballet', 'swimming', 'coding', 'robotics',
+             'theater', 'fencing', 'chess', 'cooking', 'gymnastics', 'basketball', 'film']
+PREFERRED = ['sports', 'art classes', 'music lessons', 'summer camp', 'dance', 'no preference', 'stem']
+FEEDBACK = ['closer please', 'something cheaper', 'something different, maybe music',
+            'not the first one', 'more art']
+
+# The states a virtual user walks, in order ('start' is the greeting turn)
+FLOW = ['start', 'initial', 'location', 'num_children', 'child_details', 'interests', 'recommendations']
+
+
+def random_answer(state: str, rng: random.Random) -> str:
+    """A plausible parent reply to the question asked in `state`"""
+    if state == 'initial':
+        return rng.choice(LOCATIONS)
+    if state == 'location':
+        return str(rng.choice([1, 1, 1, 2, 3]))
+    if state == 'num_children':
+        birthdate = date.today() - timedelta(days=rng.randint(3 * 365, 14 * 365))
+        return f"{rng.choice(NAMES)}, {birthdate.isoformat()}"
+    if state == 'child_details':
+        return ', '.join(rng.sample(INTERESTS, rng.randint(1, 3)))
+    if state == 'interests':
+        return rng.choice(PREFERRED)
+    return rng.choice(FEEDBACK)
+
+
+def random_intro(rng: random.Random) -> str:
+    """A first reply that answers several questions at once"""
+    kids = rng.sample(NAMES, rng.choice([1, 1, 2, 3]))
+    details = ' and '.join(
+        f"{name} {(date.today() - timedelta(days=rng.randint(3 * 365, 14 * 365))).isoformat()}" for name in kids
+    )
+    noun = 'kid' if len(kids) == 1 else 'kids'
+    likes = '. '.join(f"{name} loves {' and '.join(rng.sample(INTERESTS, 2))}" for name in kids)
+    return f"We live in {rng.choice(LOCATIONS)} with {len(kids)} {noun}, {details}. {likes}."
+
+
+def is_error(response: Dict) -> bool:
+    """A turn the handler failed on, whether it raised or apologised"""
+    return ('error' in response
+            or response.get('recommendation') == TROUBLE_MESSAGE
+            or not isinstance(response.get('nextState'), str))
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LoadTest:
+    """
+    Simulates concurrent parents walking the conversation flow and records
+    latency per conversation state.
+
+    `send(session_id, user_input, state, user_data)` is the system under test;
+    it must return handle_conversation's response dict.
+    """
+
+    def __init__(self, send: Callable[[str, str, str, Dict], Dict], users: int = 16,
+                 sessions: int = 200, think_time: float = 0.0, seed: int = 0,
+                 one_shot: float = 0.0, max_turns: int = 20):
+        self.send = send
+        self.users = users
+        self.sessions = sessions
+        self.think_time = think_time
+        self.seed = seed
+        # Share of sessions whose first reply describes the whole family
+        self.one_shot = one_shot
+        self.max_turns = max_turns
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.completed_sessions = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._session_ids = iter(range(sessions))
+
+    def _record(self, state: str, latency: float, ok: bool):
+        with self._lock:
+            self.latencies[state].append(latency)
+            if not ok:
+                self.errors[state] += 1
+
+    def _turn(self, session_id: str, user_input: str, state: str, user_data: Dict, label: str):
+        start = time.perf_counter()
+        try:
+            response = self.send(session_id, user_input, state, user_data)
+            ok = not is_error(response)
+        except Exception as e:
+            logger.debug(f"Turn failed in {label}: {str(e)}")
+            response, ok = None, False
+        self._record(label, time.perf_counter() - start, ok)
+        return response
+
+    def _run_session(self, number: int, rng: random.Random) -> bool:
+        session_id = f"vu-session-{number}"
+        response = self._turn(session_id, 'start', 'initial', {}, 'start')
+        if not response:
+            return False
+        state, user_data = response['nextState'], response['userData']
+        one_shot = rng.random() < self.one_shot
+
+        for _ in range(self.max_turns):
+            if self.think_time:
+                time.sleep(rng.uniform(0, self.think_time))
+            sent_state, sent_data = state, user_data
+            if one_shot and state == 'initial':
+                answer = random_intro(rng)
+            else:
+                answer = random_answer(state, rng)
+            response = self._turn(session_id, answer, state, user_data, state)
+            if not response:
+                return False
+            state, user_data = response['nextState'], response['userData']
+            if sent_state == 'recommendations':
+                return True
+            if state == sent_state and user_data == sent_data and not is_error(response):
+                # The handler re-asked the same question: count it as a failed turn
+                with self._lock:
+                    self.errors[sent_state] += 1
+        return False
+
+    def _virtual_user(self, index: int):
+        rng = random.Random(self.seed * 1000 + index)
+        while True:
+            with self._lock:
+                number = next(self._session_ids, None)
+            if number is None:
+                return
+            if self._run_session(number, rng):
+                with self._lock:
+                    self.completed_sessions += 1
+
+    def run(self) -> Dict:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.users, thread_name_prefix='vu') as executor:
+            list(executor.map(self._virtual_user, range(self.users)))
+        self.elapsed = time.perf_counter() - start
+        return self.report()
+
+    def report(self) -> Dict:
+        turns = sum(len(v) for v in self.latencies.values())
+        states = {}
+        for state in FLOW:
+            values = sorted(self.latencies.get(state, []))
+            if not values:
+                continue
+            states[state] = {
+                'count': len(values),
+                'errors': self.errors.get(state, 0),
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': values[-1] * 1000,
+            }
+        return {
+            'users': self.users,
+            'sessions': self.completed_sessions,
+            'turns': turns,
+            'elapsed_s': self.elapsed,
+            'turns_per_s': turns / self.elapsed if self.elapsed else 0.0,
+            'sessions_per_s': self.completed_sessions / self.elapsed if self.elapsed else 0.0,
+            'turns_per_session': turns / self.completed_sessions if self.completed_sessions else 0.0,
+            'states': states,
+        }
+
+
+def print_report(report: Dict):
+    print(f"\n=== Load test: {report['users']} virtual users ===")
+    print(f"Sessions completed: {report['sessions']}  Turns: {report['turns']}  "
+          f"Elapsed: {report['elapsed_s']:.2f}s")
+    print(f"Throughput: {report['turns_per_s']:.1f} turns/s, {report['sessions_per_s']:.1f} sessions/s, "
+          f"{report['turns_per_session']:.1f} turns/session\n")
+    print(f"{'state':<16}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for state, stats in report['states'].items():
+        print(f"{state:<16}{stats['count']:>8}{stats['errors']:>8}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent chat load generator for ConversationHandler")
+    parser.add_argument('--users', type=int, default=16, help="concurrent virtual users")
+    parser.add_argument('--sessions', type=int, default=200, help="total conversations to run")
+    parser.add_argument('--think-time', type=float, default=0.0, help="max random pause between turns (s)")
+    parser.add_argument('--pool', type=int, default=0, help="run against a HandlerPool with this many workers")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--one-shot', type=float, default=0.0,
+                        help="share of sessions that open with a multi-slot reply (0-1)")
+    args = parser.parse_args()
+
+    if args.pool:
+        from handler_pool import HandlerPool
+
+        target = HandlerPool(workers=args.pool).start()
+        send = target.handle_conversation
+    else:
+        from conversation_handler import ConversationHandler
+
+        target = ConversationHandler()
+        send = lambda session_id, user_input, state, user_data: \
+            target.handle_conversation(user_input, state, user_data)
+
+    try:
+        print_report(LoadTest(send, args.users, args.sessions, args.think_time, args.seed, args.one_shot).run())
+    finally:
+        if args.pool:
+            target.close()
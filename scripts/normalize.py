@@ -0,0 +1,134 @@
+import re
+from typing import Dict, FrozenSet, List, Optional
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+WHITESPACE_RE = re.compile(r'\s+')
+SPACE_BEFORE_PUNCT_RE = re.compile(r'\s+([,.;)])')
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it',
+    'of', 'on', 'or', 'our', 'the', 'their', 'this', 'to', 'with', 'your', 'we', 'you', 'all',
+}
+
+# Longest suffixes first; each entry is (suffix, replacement, minimum stem length)
+SUFFIXES = [
+    ('ational', 'ate', 3), ('ization', 'ize', 3), ('iveness', 'ive', 3), ('fulness', 'ful', 3),
+    ('ousness', 'ous', 3), ('ements', '', 4), ('ement', '', 4), ('ments', '', 4), ('ment', '', 4),
+    ('ings', '', 3), ('ing', '', 3), ('ies', 'y', 2), ('ers', '', 3), ('er', '', 3),
+    ('edly', '', 3), ('ed', '', 3), ('es', '', 3), ('s', '', 3),
+]
+
+
+def activity_id(activity: Dict) -> str:
+    """Stable key for an activity (the listing URL, falling back to its name)"""
+    return activity.get('url') or (activity.get('name') or '').strip()
+
+
+def clean_text(value: Optional[str]) -> str:
+    """Trim and collapse internal whitespace"""
+    return WHITESPACE_RE.sub(' ', value or '').strip()
+
+
+def fold(value: Optional[str]) -> str:
+    """Case-folded, whitespace-normalized form used for matching"""
+    return clean_text(value).casefold()
+
+
+def stem(word: str) -> str:
+    """Light suffix-stripping stemmer: dancing/dances/dance -> danc, classes -> class"""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith('ss'):
+        return word
+    for suffix, replacement, min_stem in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            word = word[:-len(suffix)] + replacement
+            break
+    # dance/danc, code/cod: drop a trailing silent e so both forms agree
+    if len(word) > 3 and word.endswith('e'):
+        word = word[:-1]
+    # running -> runn -> run
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in 'lsz':
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Case-folded, stemmed content words"""
+    return [stem(t) for t in TOKEN_RE.findall(fold(text)) if t not in STOPWORDS]
+
+
+def token_set(text: Optional[str]) -> FrozenSet[str]:
+    return frozenset(tokenize(text))
+
+
+def normalize_phone(value: Optional[str]) -> str:
+    """US numbers as '(212) 415-5500'; anything else is just trimmed"""
+    value = clean_text(value)
+    digits = re.sub(r'\D', '', value)
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]
+    if len(digits) == 10:
+        return f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"
+    return value
+
+
+def normalize_zip(value: Optional[str]) -> str:
+    """Five-digit ZIP (drops ZIP+4 suffixes)"""
+    match = re.search(r'\b(\d{5})(?:-\d{4})?\b', clean_text(value))
+    return match.group(1) if match else clean_text(value)
+
+
+def normalize_address(value: Optional[str]) -> str:
+    value = SPACE_BEFORE_PUNCT_RE.sub(r'\1', clean_text(value))
+    return value.rstrip(',').strip()
+
+
+def search_fields(activity: Dict) -> Dict:
+    """Precomputed match keys and stemmed token lists for one activity"""
+    location = activity.get('location') or {}
+    summary = activity.get('review_summary') or {}
+    name_tokens = tokenize(activity.get('name'))
+    body = ' '.join([
+        activity.get('description') or '',
+        location.get('name') or '',
+        ' '.join(summary.get('top_keywords') or []),
+    ])
+    return {
+        'name': fold(activity.get('name')),
+        'city': fold(location.get('city')),
+        'zip': location.get('zip') or '',
+        'name_tokens': sorted(set(name_tokens)),
+        'tokens': sorted(set(name_tokens) | set(tokenize(body))),
+    }
+
+
+def normalize_activity(activity: Dict) -> Dict:
+    """Clean display fields in place and attach `search` match keys"""
+    for key in ('name', 'description', 'email'):
+        if isinstance(activity.get(key), str):
+            activity[key] = clean_text(activity[key])
+
+    location = activity.get('location')
+    if isinstance(location, dict):
+        for key in ('name', 'city', 'state'):
+            if isinstance(location.get(key), str):
+                location[key] = clean_text(location[key])
+        if location.get('state'):
+            location['state'] = location['state'].upper()
+        if location.get('address'):
+            location['address'] = normalize_address(location['address'])
+        if location.get('zip'):
+            location['zip'] = normalize_zip(location['zip'])
+        if location.get('phone'):
+            location['phone'] = normalize_phone(location['phone'])
+
+    activity['search'] = search_fields(activity)
+    return activity
+
+
+def normalize_activities(activities: List[Dict]) -> List[Dict]:
+    """Ingest step: normalize every activity in the catalog"""
+    for activity in activities:
+        normalize_activity(activity)
+    return activities
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def child_age(birthdate: Optional[str], today: Optional[date] = None) -> Optional[int]:
+    """Age in whole years from a 'YYYY-MM-DD' birthdate, or None if unparseable"""
+    if not birthdate:
+        return None
+    try:
+        born = datetime.strptime(birthdate.strip(), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+    today = today or date.today()
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+def _normalize(text: Optional[str]) -> str:
+    return ' '.join((text or '').casefold().split())
+
+
+def profile_signature(location: Optional[str],
+                      children: Iterable[Tuple[Optional[int], Iterable[str], Optional[str]]]) -> Tuple:
+    """Cache key for a recommendation request: parents asking for the same
+    thing in the same place get the same key regardless of spelling/order.
+    `children` holds (age, interests, preferred activity) per child; exact
+    ages are used, since ranking filters listings on their age range"""
+    return (
+        _normalize(location),
+        tuple(sorted(
+            (
+                -1 if age is None else age,
+                tuple(sorted({_normalize(i) for i in interests if _normalize(i)})),
+                _normalize(preferred_activity),
+            )
+            for age, interests, preferred_activity in children
+        )),
+    )
+
+
+class RecommendationCache:
+    """
+    LRU + TTL cache of ranked recommendation pools keyed by profile signature.
+    Entries are tied to a catalog version; a lookup against a newer version
+    (or an explicit invalidate() on hot reload) drops everything.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, signature: Tuple, version: int) -> Optional[Any]:
+        with self._lock:
+            if version != self.version:
+                self._reset(version)
+            entry = self._entries.get(signature)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[signature]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(signature)
+            self.hits += 1
+            return value
+
+    def put(self, signature: Tuple, version: int, value: Any):
+        with self._lock:
+            if version != self.version:
+                self._reset(version)
+            self._entries[signature] = (time.monotonic(), value)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, version: Optional[int] = None):
+        """Drop all entries (called when a new catalog version is swapped in)"""
+        with self._lock:
+            self._reset(version)
+
+    def _reset(self, version: Optional[int]):
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self.version = version
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
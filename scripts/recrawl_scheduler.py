@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import math
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from normalize import activity_id
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = Path('crawl_history.db')
+DAY = 86400.0
+
+# Fields that change without the listing itself changing
+VOLATILE_FIELDS = {'position', 'image_filename', 'search', 'review_summary'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listing_history (
+    key TEXT PRIMARY KEY,
+    content_hash TEXT,
+    first_seen REAL NOT NULL,
+    last_crawled REAL,
+    last_changed REAL,
+    crawls INTEGER NOT NULL DEFAULT 0,
+    changes INTEGER NOT NULL DEFAULT 0,
+    observed_seconds REAL NOT NULL DEFAULT 0,
+    scheduled INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def content_hash(activity: Dict) -> str:
+    """Fingerprint of a listing's crawled content"""
+    content = {k: v for k, v in activity.items() if k not in VOLATILE_FIELDS}
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class RecrawlScheduler:
+    """
+    Decides which listings get their detail page re-fetched on a run.
+
+    Every crawl of a listing is recorded with a content fingerprint, so each
+    listing accumulates crawls, detected changes and time observed. Its change
+    rate is estimated as a Poisson rate from how many crawl intervals saw a
+    change, floored by a prior of `prior_changes` per `prior_days` that fades
+    as history accumulates, so rarely seen listings are not written off as
+    static. A run spends its `budget` on the listings most likely to have
+    changed since their last crawl, 1 - exp(-rate * age); listings never
+    crawled, or not crawled for `max_staleness_days`, go first. Listings left
+    out keep their previous record and cost no requests.
+    """
+
+    def __init__(self, path: Path = HISTORY_FILE, budget: Optional[int] = 40,
+                 prior_changes: float = 1.0, prior_days: float = 30.0,
+                 max_staleness_days: float = 30.0):
+        self.path = Path(path)
+        self.budget = budget
+        self.prior_changes = prior_changes
+        self.prior_days = prior_days
+        self.max_staleness_days = max_staleness_days
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def change_rate(self, row: sqlite3.Row) -> float:
+        """Estimated changes per day"""
+        intervals = row['crawls'] - 1
+        observed_days = row['observed_seconds'] / DAY
+        prior = self.prior_changes / (observed_days + self.prior_days)
+        if intervals <= 0 or observed_days <= 0:
+            return prior
+        # A crawl only sees whether the listing changed at least once since the
+        # previous one, so the raw changes/time ratio underestimates busy listings
+        changes = min(row['changes'], intervals)
+        estimate = -math.log((intervals - changes + 0.5) / (intervals + 0.5)) / (observed_days / intervals)
+        return max(estimate, prior)
+
+    def change_probability(self, row: Optional[sqlite3.Row], now: float) -> float:
+        """Chance the listing changed since it was last crawled (2.0 = must crawl)"""
+        if row is None or row['last_crawled'] is None:
+            return 2.0
+        age_days = max(now - row['last_crawled'], 0.0) / DAY
+        if age_days >= self.max_staleness_days:
+            return 1.0 + age_days / (age_days + self.max_staleness_days)
+        return 1.0 - math.exp(-self.change_rate(row) * age_days)
+
+    def start_run(self):
+        """Forget the plan of a previous (finished or abandoned) run"""
+        self.conn.execute("UPDATE listing_history SET scheduled = 0 WHERE scheduled = 1")
+
+    def plan(self, keys: Iterable[str], now: Optional[float] = None) -> Dict[str, float]:
+        """
+        Schedule the most change-prone of `keys` within what is left of this
+        run's budget. Returns {key: change probability} for the scheduled ones.
+        """
+        now = now or time.time()
+        keys = list(dict.fromkeys(keys))
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO listing_history (key, first_seen) VALUES (?, ?)",
+                [(key, now) for key in keys]
+            )
+            rows = {
+                row['key']: row
+                for row in self.conn.execute(
+                    f"SELECT * FROM listing_history WHERE key IN ({', '.join('?' * len(keys))})", keys
+                )
+            } if keys else {}
+            spent = self.conn.execute("SELECT COUNT(*) FROM listing_history WHERE scheduled = 1").fetchone()[0]
+
+            candidates = [
+                (self.change_probability(rows.get(key), now), key)
+                for key in keys if not rows[key]['scheduled']
+            ]
+            candidates.sort(key=lambda pair: -pair[0])
+            if self.budget is not None:
+                candidates = candidates[:max(self.budget - spent, 0)]
+
+            self.conn.executemany(
+                "UPDATE listing_history SET scheduled = 1 WHERE key = ?", [(key,) for _, key in candidates]
+            )
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+
+        logger.info(f"Recrawl plan: {len(candidates)} of {len(keys)} listings "
+                    f"(budget {self.budget}, already scheduled {spent})")
+        return {key: probability for probability, key in candidates}
+
+    def is_scheduled(self, key: str) -> bool:
+        row = self.conn.execute("SELECT scheduled FROM listing_history WHERE key = ?", (key,)).fetchone()
+        # Listings the planner never saw are crawled rather than silently skipped
+        return row is None or bool(row['scheduled'])
+
+    def record(self, activities: List[Dict], keys: Iterable[str], now: Optional[float] = None) -> int:
+        """
+        Record the crawl of `keys` (listings fetched this run) and clear the
+        plan. Returns how many of them changed since their previous crawl.
+        """
+        now = now or time.time()
+        crawled = set(keys)
+        changed = 0
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for activity in activities:
+                key = activity_id(activity)
+                if key not in crawled:
+                    continue
+                fingerprint = content_hash(activity)
+                row = self.conn.execute("SELECT * FROM listing_history WHERE key = ?", (key,)).fetchone()
+                if row is None or row['last_crawled'] is None:
+                    self.conn.execute(
+                        "INSERT INTO listing_history (key, content_hash, first_seen, last_crawled, crawls) "
+                        "VALUES (?, ?, ?, ?, 1) ON CONFLICT (key) DO UPDATE SET "
+                        "content_hash = excluded.content_hash, last_crawled = excluded.last_crawled, crawls = 1",
+                        (key, fingerprint, now, now)
+                    )
+                    continue
+
+                is_changed = fingerprint != row['content_hash']
+                changed += is_changed
+                self.conn.execute(
+                    "UPDATE listing_history SET content_hash = ?, last_crawled = ?, crawls = crawls + 1, "
+                    "changes = changes + ?, observed_seconds = observed_seconds + ?, "
+                    "last_changed = CASE WHEN ? THEN ? ELSE last_changed END WHERE key = ?",
+                    (fingerprint, now, int(is_changed), max(now - row['last_crawled'], 0.0),
+                     int(is_changed), now, key)
+                )
+            self.conn.execute("UPDATE listing_history SET scheduled = 0 WHERE scheduled = 1")
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return changed
+
+    def stats(self) -> Dict[str, float]:
+        row = self.conn.execute(
+            "SELECT COUNT(*) AS listings, SUM(crawls) AS crawls, SUM(changes) AS changes, "
+            "SUM(scheduled) AS scheduled FROM listing_history"
+        ).fetchone()
+        return {key: row[key] or 0 for key in row.keys()}
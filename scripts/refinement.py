@@ -0,0 +1,129 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from catalog_store import activity_id
+from gazetteer import GAZETTEER
+
+CLOSER_RE = re.compile(r'\b(closer|nearer|nearby|near me|near us|walking distance|too far)\b', re.IGNORECASE)
+CHEAPER_RE = re.compile(
+    r'\b(cheaper|less expensive|too expensive|cheap|budget|affordable|lower price|free)\b', re.IGNORECASE
+)
+# Not "more" or "try": "more like the first one" and "try again" don't ask for a new kind
+DIFFERENT_RE = re.compile(
+    r'\b(different|other|something else|instead|another|prefer|rather)\b', re.IGNORECASE
+)
+EXCLUDE_RE = re.compile(
+    r'\b(?:not|no|remove|exclude|skip|without|drop|hide|except)\b(?:\s+(?:the|that|this))?\s+([^,.;!?]+)',
+    re.IGNORECASE
+)
+NUMBER_RE = re.compile(r'(?:#|\bnumber\s+|\b)(\d{1,2})(?:st|nd|rd|th)?\b', re.IGNORECASE)
+ORDINALS = {'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5, 'last': -1}
+WORD_RE = re.compile(r"[a-z][a-z'&-]+")
+ACRONYM_RE = re.compile(r"\b[A-Z]{2,}\b")
+
+# Words that carry no activity-type meaning in feedback like
+# "show me something different, maybe music instead"
+STOPWORDS = {
+    'a', 'an', 'and', 'any', 'are', 'be', 'but', 'can', 'could', 'do', 'does', 'for', 'get',
+    'give', 'have', 'i', 'id', "i'd", 'in', 'into', 'is', 'it', 'just', 'kind', 'kinds', 'like',
+    'maybe', 'me', 'more', 'my', 'of', 'on', 'one', 'ones', 'or', 'other', 'options', 'please',
+    'prefer', 'rather', 'recommendations', 'see', 'show', 'some', 'something', 'else', 'that',
+    'the', 'them', 'these', 'they', 'thing', 'things', 'this', 'those', 'to', 'try', 'type',
+    'types', 'us', 'want', 'we', 'what', 'with', 'would', 'you', 'different', 'instead',
+    'another', 'activity', 'activities', 'how', 'about', 'perhaps', 'our', 'kid', 'kids',
+    'child', 'son', 'daughter', 'he', 'she', 'likes', 'loves', 'interested',
+}
+
+
+def _exclusions(text: str, previous: List[Dict]) -> List[str]:
+    """Ids of previously shown items the user asked to drop"""
+    excluded = []
+    for clause in EXCLUDE_RE.findall(text):
+        clause_lower = clause.lower()
+        positions = [int(n) for n in NUMBER_RE.findall(clause_lower)]
+        positions += [ORDINALS[w] for w in WORD_RE.findall(clause_lower) if w in ORDINALS]
+        for position in positions:
+            index = position - 1 if position > 0 else len(previous) + position
+            if 0 <= index < len(previous):
+                excluded.append(activity_id(previous[index]))
+
+        clause_words = set(WORD_RE.findall(clause_lower)) - STOPWORDS
+        for item in previous:
+            name = item.get('name') or ''
+            name_words = set(WORD_RE.findall(name.lower())) - STOPWORDS
+            # Short words only count when the name spells them as an acronym ("BAX"),
+            # and place acronyms ("NYC") say where, not which
+            distinctive = {w for w in name_words if len(w) > 3}
+            distinctive |= {w.lower() for w in ACRONYM_RE.findall(name) if GAZETTEER.lookup(w) is None}
+            if clause_words & distinctive:
+                excluded.append(activity_id(item))
+    return list(dict.fromkeys(excluded))
+
+
+def _activity_type(text: str) -> Optional[str]:
+    """The activity type asked for in 'something different, maybe music'"""
+    if not DIFFERENT_RE.search(text):
+        return None
+    remainder = EXCLUDE_RE.sub(' ', text)
+    for pattern in (CLOSER_RE, CHEAPER_RE, DIFFERENT_RE):
+        remainder = pattern.sub(' ', remainder)
+    words = [w for w in WORD_RE.findall(remainder.lower()) if w not in STOPWORDS and w not in ORDINALS]
+    return ' '.join(words) or None
+
+
+def parse_feedback(feedback: str, previous: List[Dict]) -> Dict:
+    """
+    Turns free-text feedback on a list of recommendations into constraint deltas:
+    closer, cheaper, a different activity type, and items to exclude
+    """
+    text = feedback or ''
+    activity_type = _activity_type(text)
+    return {
+        'closer': bool(CLOSER_RE.search(text)),
+        'cheaper': bool(CHEAPER_RE.search(text)),
+        'different': bool(DIFFERENT_RE.search(text)) or activity_type is not None,
+        'activity_type': activity_type,
+        'exclude': _exclusions(text, previous),
+    }
+
+
+@dataclass
+class CandidatePool:
+    """Ranked candidates retained from a recommendation turn, plus the
+    constraints accumulated by refinements so far. `home` is where the user
+    lives, kept apart from the profile's retrieval location so "closer" still
+    applies after retrieval has been widened past it"""
+    profile: Dict
+    ranked: List[Tuple[float, str]]
+    version: int
+    excluded: Set[str] = field(default_factory=set)
+    constraints: Dict = field(default_factory=dict)
+    home: Optional[str] = None
+
+    def refined(self, deltas: Dict, shown: List[str]) -> 'CandidatePool':
+        """A new pool over the same candidates with the feedback deltas applied"""
+        excluded = set(self.excluded) | set(deltas['exclude'])
+        if deltas['different'] and not deltas['closer'] and not deltas['cheaper']:
+            excluded |= set(shown)
+
+        constraints = dict(self.constraints)
+        if deltas['closer']:
+            constraints['closer'] = True
+        if deltas['cheaper']:
+            constraints['cheaper'] = True
+        if deltas['activity_type']:
+            constraints['activity_type'] = deltas['activity_type']
+
+        return CandidatePool(self.profile, self.ranked, self.version, excluded, constraints, self.home)
+
+    def state(self) -> Dict:
+        """The session's accumulated refinements, as carried in its user data"""
+        return {'excluded': sorted(self.excluded), 'constraints': dict(self.constraints)}
+
+    def with_state(self, state: Dict) -> 'CandidatePool':
+        """This pool's candidates under a session's own refinements"""
+        return CandidatePool(
+            self.profile, self.ranked, self.version,
+            set(state.get('excluded', ())), dict(state.get('constraints', {})), self.home
+        )
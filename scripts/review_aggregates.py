@@ -0,0 +1,106 @@
+import math
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Weight of the catalog-wide prior in the Bayesian score, in "virtual reviews"
+PRIOR_WEIGHT = 5
+# A review this many days old counts half as much as one written today
+HALF_LIFE_DAYS = 365
+TOP_KEYWORDS = 5
+
+WORD_RE = re.compile(r"[a-z][a-z']{2,}")
+STOPWORDS = {
+    'the', 'and', 'for', 'was', 'were', 'are', 'with', 'this', 'that', 'they', 'them', 'their',
+    'our', 'has', 'have', 'had', 'but', 'not', 'you', 'your', 'she', 'her', 'his', 'him', 'its',
+    'from', 'all', 'very', 'really', 'about', 'there', 'what', 'when', 'who', 'will', 'would',
+    'can', 'just', 'one', 'also', 'been', 'more', 'out', 'than', 'into', 'which', 'kids', 'kid',
+    'child', 'children', 'son', 'daughter', "it's", 'year', 'years', 'time', 'every', 'much',
+}
+
+
+def _rating(review: Dict) -> Optional[float]:
+    try:
+        return float((review.get('reviewRating') or {}).get('ratingValue'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _published(review: Dict) -> Optional[datetime]:
+    value = review.get('datePublished')
+    if not value:
+        return None
+    try:
+        published = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return published if published.tzinfo else published.replace(tzinfo=timezone.utc)
+
+
+def summarize_activity_reviews(activity: Dict, prior_mean: float = 4.0,
+                               now: Optional[datetime] = None) -> Dict:
+    """Compact aggregate of an activity's raw review / aggregateRating JSON-LD"""
+    now = now or datetime.now(timezone.utc)
+    reviews = activity.get('reviews') or []
+    if isinstance(reviews, dict):
+        reviews = [reviews]
+
+    ratings = []
+    weighted_sum = 0.0
+    weight_total = 0.0
+    keywords = Counter()
+    for review in reviews:
+        if not isinstance(review, dict):
+            continue
+        rating = _rating(review)
+        if rating is not None:
+            ratings.append(rating)
+            published = _published(review)
+            age_days = (now - published).days if published else HALF_LIFE_DAYS
+            weight = math.pow(0.5, max(age_days, 0) / HALF_LIFE_DAYS)
+            weighted_sum += weight * rating
+            weight_total += weight
+        body = (review.get('reviewBody') or '').lower()
+        keywords.update(w for w in WORD_RE.findall(body) if w not in STOPWORDS)
+
+    count = len(ratings)
+    total = sum(ratings)
+    if not count:
+        # Fall back to the listing's aggregateRating when individual reviews are missing
+        aggregate = activity.get('rating') or {}
+        try:
+            mean = float(aggregate.get('ratingValue'))
+            count = int(float(aggregate.get('reviewCount') or aggregate.get('ratingCount') or 1))
+            total = mean * count
+        except (TypeError, ValueError):
+            count, total = 0, 0.0
+
+    mean = total / count if count else None
+    return {
+        'count': count,
+        'mean': round(mean, 3) if mean is not None else None,
+        'bayesian': round((PRIOR_WEIGHT * prior_mean + total) / (PRIOR_WEIGHT + count), 3),
+        'recency_weighted': round(weighted_sum / weight_total, 3) if weight_total else
+        (round(mean, 3) if mean is not None else None),
+        'top_keywords': [word for word, _ in keywords.most_common(TOP_KEYWORDS)],
+    }
+
+
+def summarize_reviews(activities: List[Dict], now: Optional[datetime] = None) -> List[Dict]:
+    """
+    Ingest step: attach a `review_summary` to every activity. The Bayesian
+    score shrinks each listing's mean toward the catalog-wide mean, so a single
+    5-star review does not outrank forty 4.8s.
+    """
+    all_ratings = [
+        rating
+        for activity in activities
+        for review in (activity.get('reviews') or [])
+        if isinstance(review, dict) and (rating := _rating(review)) is not None
+    ]
+    prior_mean = sum(all_ratings) / len(all_ratings) if all_ratings else 4.0
+
+    for activity in activities:
+        activity['review_summary'] = summarize_activity_reviews(activity, prior_mean, now)
+    return activities
@@ -0,0 +1,165 @@
+from typing import Any, Dict, List, Optional, TypedDict, Union
+
+import msgspec
+
+# JSON-LD publishes ratings as numbers or numeric strings
+Number = Union[str, float, None]
+
+
+class Location(TypedDict, total=False):
+    name: Optional[str]
+    address: Optional[str]
+    city: Optional[str]
+    state: Optional[str]
+    zip: Optional[str]
+    phone: Optional[str]
+
+
+# schema.org keys such as "@type" are not identifiers, hence the functional form
+Rating = TypedDict('Rating', {
+    '@type': str,
+    'ratingValue': Number,
+    'bestRating': Number,
+    'worstRating': Number,
+    'reviewCount': Number,
+    'ratingCount': Number,
+}, total=False)
+
+Review = TypedDict('Review', {
+    '@type': str,
+    'name': Optional[str],
+    'author': Any,
+    'datePublished': Optional[str],
+    'reviewBody': Optional[str],
+    'reviewRating': Rating,
+}, total=False)
+
+
+class AgeRange(TypedDict):
+    min: int
+    max: int
+
+
+class ReviewSummary(TypedDict):
+    count: int
+    mean: Optional[float]
+    bayesian: float
+    recency_weighted: Optional[float]
+    top_keywords: List[str]
+
+
+class SearchFields(TypedDict):
+    name: str
+    city: str
+    zip: str
+    name_tokens: List[str]
+    tokens: List[str]
+
+
+class Activity(TypedDict, total=False):
+    name: Optional[str]
+    url: Optional[str]
+    image_url: Optional[str]
+    image_filename: Optional[str]
+    email: Optional[str]
+    position: Optional[int]
+    description: Optional[str]
+    location: Location
+    reviews: Union[List[Review], Review]
+    rating: Rating
+    age_range: AgeRange
+    prices: List[float]
+    schedules: List[str]
+    review_summary: ReviewSummary
+    search: SearchFields
+
+
+class Child(TypedDict, total=False):
+    name: str
+    birthdate: str
+    interests: List[str]
+    preferred_activity: str
+
+
+class Refinement(TypedDict, total=False):
+    excluded: List[str]
+    constraints: Dict[str, Any]
+
+
+class UserData(TypedDict, total=False):
+    location: str
+    num_children: int
+    children: List[Child]
+    currentChild: Optional[str]
+    pending_interests: List[str]
+    pending_ages: List[int]
+    recommended_ids: List[str]
+    refinement: Refinement
+
+
+class HandlerRequest(TypedDict, total=False):
+    id: Any
+    sessionId: str
+    userInput: str
+    currentState: str
+    userData: UserData
+
+
+class HandlerResponse(TypedDict, total=False):
+    message: str
+    nextState: str
+    userData: UserData
+    recommendation: str
+    error: str
+
+
+class _Envelope(TypedDict, total=False):
+    id: Any
+
+
+# Decoded in one pass straight into the schema. Lenient (strict=False), so
+# values a JSON client sends as strings ("num_children": "2") still coerce
+# to the declared type. TypedDicts drop keys they don't declare, so every
+# key the pipeline writes or reads has to be declared above.
+_catalog_decoder = msgspec.json.Decoder(List[Activity], strict=False)
+_request_decoder = msgspec.json.Decoder(HandlerRequest, strict=False)
+_user_data_decoder = msgspec.json.Decoder(UserData, strict=False)
+_envelope_decoder = msgspec.json.Decoder(_Envelope)
+_encoder = msgspec.json.Encoder()
+
+ValidationError = msgspec.ValidationError
+DecodeError = msgspec.DecodeError
+
+
+def decode_catalog(data: Union[bytes, str]) -> List[Dict]:
+    return _catalog_decoder.decode(data)
+
+
+def validate_catalog(activities: List[Dict]) -> List[Dict]:
+    """Check in-memory records against the Activity schema before they are published"""
+    return msgspec.convert(activities, List[Activity], strict=False)
+
+
+def decode_request(data: Union[bytes, str]) -> Dict:
+    return _request_decoder.decode(data)
+
+
+def request_id(data: Union[bytes, str]) -> Any:
+    """Best-effort id of a request that failed validation, for the error reply"""
+    try:
+        return _envelope_decoder.decode(data).get('id')
+    except (msgspec.DecodeError, msgspec.ValidationError):
+        return None
+
+
+def decode_user_data(data: Union[bytes, str]) -> Dict:
+    return _user_data_decoder.decode(data)
+
+
+def encode(obj) -> bytes:
+    return _encoder.encode(obj)
+
+
+def encode_pretty(obj) -> bytes:
+    """Indented JSON for files people read (catalog versions, manifest)"""
+    return msgspec.json.format(_encoder.encode(obj), indent=2)
@@ -1,15 +1,22 @@
-import requests
 from bs4 import BeautifulSoup
 import json
 from datetime import datetime
-import time
 import logging
 import os
 import urllib.parse
 import re
 import asyncio
+import argparse
 from playwright.async_api import async_playwright
 
+from catalog_store import CatalogStore, activity_id
+from http_fetcher import AdaptiveFetcher
+from detail_enricher import DetailEnricher, merge_details
+from review_aggregates import summarize_reviews
+from normalize import normalize_activities
+from crawl_frontier import CrawlFrontier, worker_name, DIRECTORY, DETAIL, IMAGE, DONE
+from recrawl_scheduler import RecrawlScheduler
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,22 +41,33 @@ class MommyPoppinsScraper:
         # Create directory for storing images
         self.image_dir = 'scraped_images'
         os.makedirs(self.image_dir, exist_ok=True)
+        self.catalog_store = CatalogStore()
+        # Pooled keep-alive connections with per-domain adaptive rate limiting
+        self.fetcher = AdaptiveFetcher(headers=self.headers)
+        self.enricher = DetailEnricher(self.fetcher)
+        self.image_concurrency = 8
+        # Persistent work queue shared with any other scraper processes
+        self.frontier = CrawlFrontier()
+        self.worker_id = worker_name()
+        self.poll_interval = 1.0
+        # Per-listing change history; spends each run's requests on volatile listings
+        self.scheduler = RecrawlScheduler()
+        self._previous_records = None
 
-    def fetch_page(self, url):
-        """Fetch page content with error handling and retries"""
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(url, headers=self.headers, timeout=10)
-                response.raise_for_status()
-                return response.text
-            except requests.RequestException as e:
-                logger.error(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt == max_retries - 1:
-                    raise
-                time.sleep(2 ** attempt)
-
-    def download_image(self, image_url, activity_name):
+    @property
+    def previous_records(self):
+        """Records of the currently published catalog, by activity id"""
+        if self._previous_records is None:
+            self._previous_records = {
+                activity_id(activity): activity for activity in self.catalog_store.load().activities
+            }
+        return self._previous_records
+
+    async def fetch_page(self, url):
+        """Fetch page content through the shared rate-limited fetcher"""
+        return await self.fetcher.fetch_text(url)
+
+    async def download_image(self, image_url, activity_name):
         """Download and save image to local folder."""
         try:
             if not image_url:
@@ -65,11 +83,10 @@ class MommyPoppinsScraper:
             logger.info(f"Downloading image for {activity_name}: {image_url}")
 
             # Download image
-            response = requests.get(image_url, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            content = await self.fetcher.fetch_bytes(image_url)
 
             with open(filepath, 'wb') as f:
-                f.write(response.content)
+                f.write(content)
 
             logger.info(f"Successfully saved image to {filepath}")
             return filename
@@ -119,143 +136,283 @@ class MommyPoppinsScraper:
         except Exception as e:
             logger.warning(f"Error handling popups: {str(e)}")
 
-    async def scrape_with_playwright(self):
-        """Scrape activities using Playwright for JavaScript rendering"""
+    async def scrape_with_playwright(self, fresh=False):
+        """Crawl the directory through the persistent frontier and publish the catalog"""
         try:
             logger.info("\n=== Starting scraping process with Playwright ===\n")
-            
-            async with async_playwright() as p:
-                # Launch browser with more options
-                browser = await p.chromium.launch(
-                    headless=False,  # Make browser visible for debugging
-                    slow_mo=100  # Slow down operations
+
+            if fresh:
+                self.frontier.reset()
+            # Seeding is idempotent, so an interrupted crawl resumes where it stopped
+            if self.frontier.enqueue(DIRECTORY, self.base_url, priority=10):
+                # A new crawl (not a resumed one) gets a new recrawl plan
+                self.scheduler.start_run()
+
+            await self.run_worker()
+
+            processed_activities = self.assemble_catalog()
+            if not processed_activities:
+                self.frontier.reset()
+                raise RuntimeError("Crawl produced no activities; keeping the current catalog")
+
+            # Update per-listing change history from the listings actually fetched
+            crawled = [
+                detail['key'] for detail in self.frontier.items(DETAIL)
+                if detail['status'] == DONE and (
+                    self.scheduler.is_scheduled(detail['key']) or detail['key'] not in self.previous_records)
+            ]
+            changed = self.scheduler.record(processed_activities, crawled)
+
+            # Precompute review aggregates once so readers never walk raw reviews,
+            # then clean fields and precompute the stemmed match tokens
+            summarize_reviews(processed_activities)
+            normalize_activities(processed_activities)
+
+            # Publish as a new catalog version (atomic rename + manifest)
+            manifest = self.catalog_store.publish(processed_activities)
+            # The crawl is complete; the next run starts a fresh frontier
+            self.frontier.reset()
+
+            logger.info(f"\n=== Scraping Summary ===")
+            logger.info(f"Total activities found: {len(processed_activities)}")
+            logger.info(f"Detail pages recrawled: {len(crawled)} ({changed} changed)")
+            logger.info(f"Published catalog version: {manifest['version']}")
+            logger.info(f"Changes since version {manifest['previous_version']}: {manifest['change_count']}")
+
+            return processed_activities
+
+        except Exception as e:
+            logger.error(f"Scraping failed: {str(e)}")
+            raise
+        finally:
+            await self.fetcher.close()
+
+    async def run_worker(self):
+        """Lease and process frontier items until the whole crawl has drained"""
+        logger.info(f"Worker {self.worker_id} started: {self.frontier.stats()}")
+        await asyncio.gather(
+            self._consume(DIRECTORY, self._crawl_directory, concurrency=1),
+            self._consume(DETAIL, self._crawl_detail, concurrency=self.enricher.concurrency),
+            self._consume(IMAGE, self._crawl_image, concurrency=self.image_concurrency),
+        )
+        logger.info(f"Worker {self.worker_id} finished: {self.frontier.stats()}")
+
+    async def _consume(self, kind, handler, concurrency):
+        """Keep up to `concurrency` items of one kind in flight until nothing is left"""
+        in_flight = set()
+        while True:
+            free = concurrency - len(in_flight)
+            for item in (self.frontier.lease(self.worker_id, kind, limit=free) if free else []):
+                in_flight.add(asyncio.create_task(self._process(kind, item, handler)))
+
+            if not in_flight:
+                # Other stages (or other processes) may still produce work for us
+                if not self.frontier.outstanding():
+                    return
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            _, in_flight = await asyncio.wait(
+                in_flight, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED
+            )
+
+    async def _process(self, kind, item, handler):
+        try:
+            result = await handler(item)
+            self.frontier.complete(kind, item['key'], result)
+        except Exception as e:
+            logger.error(f"Failed {kind} {item['key']} (attempt {item['attempts']}): {str(e)}")
+            self.frontier.fail(kind, item['key'], str(e))
+
+    async def _crawl_directory(self, item):
+        """Render a directory page and enqueue its detail pages and images"""
+        activities = [
+            self._build_activity(listing)
+            for listing in await self._render_directory(item['key'])
+            if isinstance(listing, dict) and listing.get('@type') == 'LocalBusiness'
+        ]
+        # Listings most likely to have changed are fetched first; the rest reuse their last record
+        plan = self.scheduler.plan(activity_id(activity) for activity in activities)
+
+        for activity in activities:
+            key = activity_id(activity)
+            self.frontier.enqueue(DETAIL, key, payload=activity, priority=int(plan.get(key, 0) * 100))
+            previous = self.previous_records.get(key) or {}
+            image_current = (
+                previous.get('image_url') == activity['image_url'] and previous.get('image_filename')
+                and os.path.exists(os.path.join(self.image_dir, previous['image_filename']))
+            )
+            if activity['image_url'] and activity['name'] and not image_current:
+                self.frontier.enqueue(IMAGE, key, payload={
+                    'image_url': activity['image_url'],
+                    'name': activity['name'],
+                })
+            logger.info(f"Processed: {activity['name']} (Position: {activity['position']})")
+        return {'activities': len(activities), 'scheduled': len(plan)}
+
+    async def _crawl_detail(self, item):
+        """Fetch a listing's detail page and return the enriched record"""
+        activity = item['payload']
+        previous = self.previous_records.get(item['key'])
+        if previous is not None and not self.scheduler.is_scheduled(item['key']):
+            # Not due for a recrawl: keep what the last crawl found
+            merge_details(activity, previous)
+            if previous.get('image_filename'):
+                activity['image_filename'] = previous['image_filename']
+            return activity
+        if not activity.get('url'):
+            return activity
+        if await self.enricher.enrich(activity) is None:
+            raise RuntimeError(f"could not enrich {activity.get('name')}")
+        return activity
+
+    async def _crawl_image(self, item):
+        payload = item['payload']
+        filename = await self.download_image(payload['image_url'], payload['name'])
+        if filename is None:
+            raise RuntimeError(f"could not download {payload['image_url']}")
+        return filename
+
+    def assemble_catalog(self):
+        """Build the catalog from the drained frontier"""
+        images = {
+            image['key']: image['result']
+            for image in self.frontier.items(IMAGE) if image['status'] == DONE
+        }
+        activities = []
+        for detail in self.frontier.items(DETAIL):
+            # Listings whose detail page kept failing keep their directory data
+            activity = detail['result'] if detail['status'] == DONE and detail['result'] else detail['payload']
+            if images.get(detail['key']):
+                activity['image_filename'] = images[detail['key']]
+            activities.append(activity)
+
+        # Sort by position
+        activities.sort(key=lambda x: int(x.get('position') or 999))
+        return activities
+
+    def _build_activity(self, item):
+        """Map a directory JSON-LD LocalBusiness entry onto an activity record"""
+        activity = {
+            'name': item.get('name'),
+            'url': item.get('url'),
+            'image_url': item.get('image'),
+            'email': item.get('email'),
+            'position': item.get('position'),
+            'description': item.get('articleBody'),
+            'location': {
+                'name': item.get('location', {}).get('name'),
+                'address': item.get('location', {}).get('address', {}).get('streetAddress'),
+                'city': item.get('location', {}).get('address', {}).get('addressLocality'),
+                'state': item.get('location', {}).get('address', {}).get('addressRegion'),
+                'zip': item.get('location', {}).get('address', {}).get('postalCode'),
+                'phone': item.get('location', {}).get('telephone')
+            }
+        }
+
+        # Add reviews and ratings
+        if 'review' in item:
+            activity['reviews'] = item['review']
+        if 'aggregateRating' in item:
+            activity['rating'] = item['aggregateRating']
+
+        return activity
+
+    async def _render_directory(self, url):
+        """Render a directory page with Playwright and return its JSON-LD entries"""
+        async with async_playwright() as p:
+            # Launch browser with more options
+            browser = await p.chromium.launch(
+                headless=False,  # Make browser visible for debugging
+                slow_mo=100  # Slow down operations
+            )
+
+            # Create context with more realistic browser behavior
+            context = await browser.new_context(
+                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+                viewport={'width': 1280, 'height': 800},
+                ignore_https_errors=True
+            )
+
+            page = await context.new_page()
+
+            # Set longer timeout and more options
+            page.set_default_timeout(60000)  # 60 seconds timeout
+            page.set_default_navigation_timeout(60000)
+
+            # Navigate with more options
+            try:
+                await page.goto(
+                    url,
+                    wait_until='networkidle',
+                    timeout=60000
                 )
-                
-                # Create context with more realistic browser behavior
-                context = await browser.new_context(
-                    user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-                    viewport={'width': 1280, 'height': 800},
-                    ignore_https_errors=True
+            except Exception as e:
+                logger.error(f"Initial navigation failed: {str(e)}")
+                # Try alternative URL or approach
+                alternative_url = "https://mommypoppins.com/new-york-city-kids/directory/camps"
+                await page.goto(
+                    alternative_url,
+                    wait_until='networkidle',
+                    timeout=60000
                 )
-                
-                page = await context.new_page()
-                
-                # Set longer timeout and more options
-                page.set_default_timeout(60000)  # 60 seconds timeout
-                page.set_default_navigation_timeout(60000)
-                
-                # Navigate with more options
-                try:
-                    await page.goto(
-                        self.base_url,
-                        wait_until='networkidle',
-                        timeout=60000
-                    )
-                except Exception as e:
-                    logger.error(f"Initial navigation failed: {str(e)}")
-                    # Try alternative URL or approach
-                    alternative_url = "https://mommypoppins.com/new-york-city-kids/directory/camps"
-                    await page.goto(
-                        alternative_url,
-                        wait_until='networkidle',
-                        timeout=60000
-                    )
-                
-                # Wait for content with more robust checks
+
+            # Wait for content with more robust checks
+            try:
+                await page.wait_for_selector('#theList', timeout=30000)
+                logger.info("Found main content container")
+            except Exception as e:
+                logger.error(f"Could not find main container: {str(e)}")
+                # Try alternative selector
+                await page.wait_for_selector('.directory-listing', timeout=30000)
+
+            # Wait for dynamic content
+            await page.wait_for_timeout(5000)
+
+            await self.handle_popups(page)
+
+            # Find all JSON-LD scripts
+            scripts = await page.query_selector_all('script[type="application/ld+json"]')
+            all_activities = []
+
+            for script in scripts:
                 try:
-                    await page.wait_for_selector('#theList', timeout=30000)
-                    logger.info("Found main content container")
+                    # Get the text content of the script
+                    script_text = await script.text_content()
+                    data = json.loads(script_text)
+
+                    if isinstance(data, list):
+                        all_activities.extend(data)
+                    else:
+                        all_activities.append(data)
                 except Exception as e:
-                    logger.error(f"Could not find main container: {str(e)}")
-                    # Try alternative selector
-                    await page.wait_for_selector('.directory-listing', timeout=30000)
-                
-                # Wait for dynamic content
-                await page.wait_for_timeout(5000)
-                
-                await self.handle_popups(page)
-                
-                # Get the page content after JavaScript execution
-                html_content = await page.content()
-                
-                # Find all JSON-LD scripts
-                scripts = await page.query_selector_all('script[type="application/ld+json"]')
-                all_activities = []
-                
-                for script in scripts:
-                    try:
-                        # Get the text content of the script
-                        script_text = await script.text_content()
-                        data = json.loads(script_text)
-                        
-                        if isinstance(data, list):
-                            all_activities.extend(data)
-                        else:
-                            all_activities.append(data)
-                    except Exception as e:
-                        logger.error(f"Error parsing script: {str(e)}")
-                
-                await browser.close()
-                
-                # Filter and process activities
-                processed_activities = []
-                for item in all_activities:
-                    if isinstance(item, dict) and item.get('@type') == 'LocalBusiness':
-                        activity = {
-                            'name': item.get('name'),
-                            'url': item.get('url'),
-                            'image_url': item.get('image'),
-                            'email': item.get('email'),
-                            'position': item.get('position'),
-                            'description': item.get('articleBody'),
-                            'location': {
-                                'name': item.get('location', {}).get('name'),
-                                'address': item.get('location', {}).get('address', {}).get('streetAddress'),
-                                'city': item.get('location', {}).get('address', {}).get('addressLocality'),
-                                'state': item.get('location', {}).get('address', {}).get('addressRegion'),
-                                'zip': item.get('location', {}).get('address', {}).get('postalCode'),
-                                'phone': item.get('location', {}).get('telephone')
-                            }
-                        }
-                        
-                        # Add reviews and ratings
-                        if 'review' in item:
-                            activity['reviews'] = item['review']
-                        if 'aggregateRating' in item:
-                            activity['rating'] = item['aggregateRating']
-                        
-                        # Download image
-                        if activity['image_url'] and activity['name']:
-                            activity['image_filename'] = self.download_image(
-                                activity['image_url'], 
-                                activity['name']
-                            )
-                        
-                        processed_activities.append(activity)
-                        logger.info(f"Processed: {activity['name']} (Position: {activity['position']})")
-                
-                # Sort by position
-                processed_activities.sort(key=lambda x: int(x.get('position', 999)))
-                
-                # Save to JSON
-                output_file = 'activities_data.json'
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(processed_activities, f, ensure_ascii=False, indent=2)
-                    
-                logger.info(f"\n=== Scraping Summary ===")
-                logger.info(f"Total activities found: {len(processed_activities)}")
-                logger.info(f"Data saved to: {output_file}")
-                
-                return processed_activities
-                
-        except Exception as e:
-            logger.error(f"Scraping failed: {str(e)}")
-            raise
+                    logger.error(f"Error parsing script: {str(e)}")
+
+            await browser.close()
+            return all_activities
 
 async def main():
+    parser = argparse.ArgumentParser(description="Scrape MommyPoppins activities")
+    parser.add_argument('--worker', action='store_true',
+                        help="only help drain an existing crawl frontier (no seeding or publishing)")
+    parser.add_argument('--fresh', action='store_true',
+                        help="discard any interrupted crawl and start over")
+    parser.add_argument('--budget', type=int, default=40,
+                        help="detail pages to re-fetch this run, most change-prone first")
+    parser.add_argument('--full', action='store_true',
+                        help="re-fetch every listing regardless of its change history")
+    args = parser.parse_args()
+
     scraper = MommyPoppinsScraper()
+    scraper.scheduler.budget = None if args.full else args.budget
     try:
-        activities = await scraper.scrape_with_playwright()
+        if args.worker:
+            try:
+                await scraper.run_worker()
+            finally:
+                await scraper.fetcher.close()
+            return
+        activities = await scraper.scrape_with_playwright(fresh=args.fresh)
         logger.info(f"Final count of activities: {len(activities)}")
     except Exception as e:
         logger.error(f"Script failed: {str(e)}")
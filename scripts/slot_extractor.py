@@ -0,0 +1,303 @@
+import re
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from gazetteer import GAZETTEER
+from interest_resolver import PHRASE_CATEGORY
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'twins': 2, 'triplets': 3,
+}
+
+_MONTH = r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?'
+_ISO_DATE = r'(?P<iso_y>\d{4})-(?P<iso_m>\d{1,2})-(?P<iso_d>\d{1,2})'
+_US_DATE = r'(?P<us_m>\d{1,2})[/.-](?P<us_d>\d{1,2})[/.-](?P<us_y>\d{4})'
+_MONTH_FIRST = rf'(?P<mf_m>{_MONTH})\s+(?:(?P<mf_d>\d{{1,2}})(?:st|nd|rd|th)?,?\s+)?(?P<mf_y>\d{{4}})'
+_DAY_FIRST = rf'(?P<df_d>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<df_m>{_MONTH}),?\s+(?P<df_y>\d{{4}})'
+DATE_PATTERN = rf'(?:{_ISO_DATE}|{_US_DATE}|{_MONTH_FIRST}|{_DAY_FIRST})'
+_NUMBER_END = r'(?![\d/.-]?\d)'
+# An age that says it is one: "(6)", "7 years old", "9 yo", "aged 5"
+_MARKED_AGE = (
+    r'(?:\(\s*(?P<paren>\d{1,2})\s*\)'
+    r'|(?:(?:who\s+)?(?:is|turning|turns)\s+|aged?\s+)?(?P<years>\d{1,2})\s*(?:years?|yrs?|y/?o)\b(?:\s+old)?'
+    r'|aged?\s+(?P<aged>\d{1,2})\b)'
+)
+# Numbers followed by these are counts, times or prices, never ages
+_NOT_AN_AGE = (
+    r'(?!\s*(?:days?|nights?|hours?|hrs?|h\b|minutes?|mins?|weeks?|wks?|months?|times?|x\b|am\b|pm\b|a\.m|p\.m'
+    r"|o'?clock|classes|sessions|lessons|dollars|bucks|blocks|miles|stops|%|\$|:\d"
+    r'|kids?\b|children|child\b|sons?\b|daughters?\b|boys?\b|girls?\b|little|young))'
+)
+# "Leo is 5", "Mia who turns 7", "Sam just turned 9"
+_STATED_AGE = rf'(?:who\s+)?(?:is\s+turning|is|turns|turning|just\s+turned)\s+(?P<stated>\d{{1,2}}){_NUMBER_END}{_NOT_AN_AGE}'
+# "Mia 7": an age only when the question asked for the children or a child
+# noun introduces the name ("my daughter Mia, 7")
+_BARE_AGE = rf'(?P<bare>\d{{1,2}}){_NUMBER_END}{_NOT_AN_AGE}'
+
+NAME = r"(?P<name>[A-Za-z][A-Za-z'-]+)"
+# "Mia, 2017-05-01", "Leo born March 3, 2019", "Ava (6)", "Sam is 9 years old", "Leo 5"
+DATE_RE = re.compile(DATE_PATTERN, re.IGNORECASE)
+# A whole answer that is only a name: "Mia", "Mary Ann", "Jean-Luc O'Neil"
+NAME_ONLY_RE = re.compile(r"[A-Za-z][A-Za-z'-]*(?:\s+[A-Za-z][A-Za-z'-]*){0,3}")
+CHILD_DATE_RE = re.compile(rf"{NAME}\s*(?:[,:(-]\s*)?(?:(?:was\s+)?born\s+(?:on\s+|in\s+)?)?{DATE_PATTERN}", re.IGNORECASE)
+CHILD_AGE_RE = re.compile(rf"{NAME}(?:\s*[,:-]\s*|\s+|(?=\())(?:{_MARKED_AGE}|{_STATED_AGE}|{_BARE_AGE})", re.IGNORECASE)
+# Ages given without names: "my kids are 5 and 7", "1 child, age 6", "a 4 year old"
+UNNAMED_AGES_RE = re.compile(
+    r"\b(?:kids?|children|child|sons?|daughters?|boys?|girls?|twins|triplets)\s*,?\s*(?:who\s+)?(?:are|is|aged?|ages)\s+"
+    rf"(?P<ages>\d{{1,2}}(?:\s*(?:,|and|&)\s*\d{{1,2}})*){_NUMBER_END}{_NOT_AN_AGE}"
+    r"|\b(?P<age>\d{1,2})[\s-]*(?:years?|yrs?)[\s-]*old\b",
+    re.IGNORECASE
+)
+LIST_GAP_RE = re.compile(r'\s*(?:,\s*)?(?:(?:and|&)\s+)?$', re.IGNORECASE)
+CHILD_NOUN_BEFORE_RE = re.compile(r"\b(?:sons?|daughters?|kids?|child|boys?|girls?)\s*[,:-]?\s*$", re.IGNORECASE)
+# group 2 counts every child ("2 kids"); group 3 counts some of them ("a boy")
+COUNT_RE = re.compile(
+    r"\b(\d+|a|an|one|two|three|four|five|six)\s+(?:(?:little|young|wonderful)\s+)?"
+    r"(?:(kids?|children|child)|sons?|daughters?|boys?|girls?)\b|\b(twins|triplets)\b",
+    re.IGNORECASE
+)
+ZIP_RE = re.compile(r'(?<![\d/.-])\b(\d{5})\b(?![/.-]\d)')
+LOCATION_CUE_RE = re.compile(
+    r"\b(?:live|living|located|based|are|we're|reside)\s+(?:in|on|near|around|by)\s+(?:the\s+)?"
+    r"([A-Za-z][A-Za-z .'-]*?)(?=\s*(?:[,.;!?]|\band\b|\bwith\b|\bwhere\b|$))",
+    re.IGNORECASE
+)
+_LIKES = (
+    r"(?:likes?|loves?|enjoys?|adores?"
+    r"|(?:is|are|'s|'re)\s+(?:really\s+)?(?:into|interested in(?!\s+finding)|obsessed with))"
+)
+# A span ends where a contrast or the next person's likes begin:
+# "Mia loves ballet and Leo likes soccer", "he likes art but she likes music"
+_SPAN_END = (
+    rf"\s*,?\s*(?:\b(?:but|while|whereas|though|although)\b"
+    rf"|(?:\band\s+)?\b[A-Za-z]+\s+(?:really\s+|also\s+)?{_LIKES}\b)"
+)
+INTEREST_RE = re.compile(
+    rf"(?:\b([A-Za-z]+)\s+)?\b{_LIKES}\s+((?:(?!{_SPAN_END})[^.;!?])+)",
+    re.IGNORECASE
+)
+PREFERRED_RE = re.compile(
+    r"\b(?:looking for|searching for|hoping (?:for|to find)|we(?:'d| would) like|interested in finding)\s+"
+    r"(?:an?\s+|some\s+)?([^.;!?]+)",
+    re.IGNORECASE
+)
+LIST_SPLIT_RE = re.compile(r'\s*(?:,|\band\b|\bor\b|&|/)\s*', re.IGNORECASE)
+FILLER_RE = re.compile(r'^(?:playing|doing|to|making|the|some|all kinds of|anything with)\s+', re.IGNORECASE)
+
+# Words that look like a name in "X likes ..." / "X, 7" but are not one
+NOT_NAMES = {
+    'i', 'we', 'he', 'she', 'they', 'it', 'and', 'my', 'our', 'the', 'a', 'an', 'who', 'that',
+    'son', 'daughter', 'kid', 'kids', 'child', 'children', 'boy', 'girl', 'boys', 'girls', 'both',
+    'also', 'really', 'is', 'was', 'born', 'age', 'aged', 'have', 'has', 'with', 'in', 'on', 'at',
+    'of', 'old', 'years', 'year', 'turning', 'twins', 'triplets', 'baby', 'toddler', 'youngest',
+    'oldest', 'one', 'two', 'three', 'four', 'five', 'six', 'just', 'zip', 'code', 'near',
+    'ages', 'to', 'from', 'for', 'maybe', 'about', 'around', 'after', 'before', 'until', 'till',
+    'under', 'over', 'than', 'every', 'each', 'by', 'or', 'between', 'like', 'only',
+    # verbs and copulas that precede a number: "my kids are 5", "we need 2"
+    'am', 'are', 'be', 'been', 'were', 'do', 'does', 'did', 'will', 'would', 'can', 'could',
+    'should', 'may', 'might', 'must', 'go', 'goes', 'get', 'gets', 'got', 'turn', 'turns',
+    'turned', 'likes', 'love', 'loves', 'enjoy', 'enjoys', 'want', 'wants', 'need', 'needs',
+    'had', 'live', 'lives', 'play', 'plays', 'attend', 'attends', 'see', 'try', 'there', 'here',
+    'these', 'those', 'this', 'them', 'his', 'her', 'their', 'your', 'you', 'me', 'us', 'not',
+    'no', 'yes', 'so', 'then', 'when', 'what', 'which', 'where', 'how', 'too', 'very', 'but',
+    'if', 'as', 'pm', 'please', 'thanks', 'hi', 'hello', 'hey', 'ok', 'okay', 'ones', 'all',
+}
+PRONOUNS = {'he', 'she', 'they', 'both', 'kids', 'children', 'son', 'daughter', 'boy', 'girl'}
+GENERIC_WANTS = {'activities', 'activity', 'something', 'anything', 'things', 'ideas', 'options', 'classes'}
+
+
+def parse_date(match: re.Match) -> Optional[str]:
+    """ISO 'YYYY-MM-DD' for a DATE_PATTERN match, or None if it is not a real date"""
+    groups = match.groupdict()
+    try:
+        if groups.get('iso_y'):
+            year, month, day = int(groups['iso_y']), int(groups['iso_m']), int(groups['iso_d'])
+        elif groups.get('us_y'):
+            year, month, day = int(groups['us_y']), int(groups['us_m']), int(groups['us_d'])
+        elif groups.get('mf_y'):
+            year, month, day = int(groups['mf_y']), MONTHS[groups['mf_m'][:3].lower()], int(groups['mf_d'] or 1)
+        else:
+            year, month, day = int(groups['df_y']), MONTHS[groups['df_m'][:3].lower()], int(groups['df_d'])
+        born = date(year, month, day)
+    except (KeyError, ValueError):
+        return None
+    if not date(1990, 1, 1) <= born <= date.today():
+        return None
+    return born.isoformat()
+
+
+def birthdate_for_age(age: int, today: Optional[date] = None) -> Optional[str]:
+    """Approximate birthdate for a stated age (today's date, `age` years ago)"""
+    today = today or date.today()
+    if not 0 <= age <= 18:
+        return None
+    try:
+        return today.replace(year=today.year - age).isoformat()
+    except ValueError:
+        # Born on Feb 29
+        return today.replace(year=today.year - age, day=28).isoformat()
+
+
+def _is_name(word: Optional[str]) -> bool:
+    return bool(word) and word.lower() not in NOT_NAMES and not word.isdigit()
+
+
+def _split_list(text: str) -> List[str]:
+    items = []
+    for item in LIST_SPLIT_RE.split(text):
+        item = FILLER_RE.sub('', item.strip(" '\"")).strip()
+        if item and item.lower() not in GENERIC_WANTS:
+            items.append(item)
+    return items
+
+
+def _is_place(text: str, end: int) -> bool:
+    """Whether the words ending at `end` name an area ("Brooklyn", "Upper West Side")"""
+    words = re.findall(r"[A-Za-z0-9.'-]+", text[:end])
+    return any(GAZETTEER.lookup(' '.join(words[-k:])) for k in range(1, min(len(words), 4) + 1))
+
+
+def _is_child_name(text: str, match: re.Match) -> bool:
+    name = match.group('name')
+    return (_is_name(name) and name.lower() not in PHRASE_CATEGORY
+            and not _is_place(text, match.end('name')))
+
+
+def _children(text: str, about_children: bool) -> Tuple[List[Dict], List[Tuple[int, int]]]:
+    """
+    Name + birthdate pairs, in the order they were mentioned. A name needs
+    an explicit cue: a birthdate, a marked or stated age ("Ava (6)", "Leo is
+    5"), or a child noun before it ("my daughter Mia, 7"). A bare "Mia 7"
+    also counts when `about_children` says the question asked for the
+    children. Places and interests are never names.
+    """
+    children, spans = [], []
+    for match in CHILD_DATE_RE.finditer(text):
+        birthdate = parse_date(match)
+        if birthdate and _is_child_name(text, match):
+            children.append((match.start(), {'name': match.group('name').strip().title(), 'birthdate': birthdate}))
+            spans.append(match.span())
+    for match in CHILD_AGE_RE.finditer(text):
+        if any(start <= match.start() < end for start, end in spans) or not _is_child_name(text, match):
+            continue
+        # "kids, Mia 7 and Leo 5": a listed name shares the cue of the one before
+        listed = bool(spans) and LIST_GAP_RE.match(text, spans[-1][1], match.start()) is not None
+        if match.group('bare') and not (
+                about_children and match.group('name')[0].isupper()
+                or CHILD_NOUN_BEFORE_RE.search(text[:match.start()]) or listed):
+            continue
+        age = (match.group('paren') or match.group('years') or match.group('aged')
+               or match.group('stated') or match.group('bare'))
+        birthdate = birthdate_for_age(int(age))
+        if birthdate:
+            children.append((match.start(), {'name': match.group('name').strip().title(), 'birthdate': birthdate}))
+            spans.append(match.span())
+    return [child for _, child in sorted(children, key=lambda pair: pair[0])], spans
+
+
+def _unnamed_ages(text: str, spans: List[Tuple[int, int]]) -> List[int]:
+    """Ages mentioned without a name, outside the spans of named children"""
+    ages = []
+    for match in UNNAMED_AGES_RE.finditer(text):
+        if any(start < match.end() and match.start() < end for start, end in spans):
+            continue
+        numbers = re.findall(r'\d{1,2}', match.group('ages') or match.group('age'))
+        ages.extend(int(n) for n in numbers if birthdate_for_age(int(n)))
+    return ages
+
+
+def _count(text: str) -> int:
+    """
+    Number of children stated. A total ("2 kids") is not added to the parts
+    that describe the same children ("a boy and a girl"); parts alone add up.
+    """
+    totals, parts = [], 0
+    for match in COUNT_RE.finditer(text):
+        word = (match.group(1) or match.group(3)).lower()
+        number = int(word) if word.isdigit() else NUMBER_WORDS.get(word, 0)
+        if match.group(2):
+            totals.append(number)
+        else:
+            parts += number
+    return max(totals) if totals else parts
+
+
+def parse_child(text: str) -> Optional[Dict]:
+    """
+    The direct answer to the name-and-birthdate question, "Mary Ann,
+    2017-05-01" or "Leo, March 3, 2019", as {name, birthdate}; None otherwise
+    """
+    name, _, rest = (text or '').partition(',')
+    name = ' '.join(name.split())
+    if not name or not NAME_ONLY_RE.fullmatch(name):
+        return None
+    match = DATE_RE.fullmatch(rest.strip())
+    birthdate = parse_date(match) if match else None
+    return {'name': name, 'birthdate': birthdate} if birthdate else None
+
+
+def _location(text: str) -> Optional[str]:
+    cue = LOCATION_CUE_RE.search(text)
+    if cue:
+        return cue.group(1).strip()
+    zip_match = ZIP_RE.search(text)
+    if zip_match and GAZETTEER.for_zip(zip_match.group(1)):
+        return zip_match.group(1)
+    return None
+
+
+def extract_slots(text: str, children: bool = True, about_children: bool = False) -> Dict:
+    """
+    Every conversation slot a single utterance fills. Keys are present only
+    when found: location, num_children, children ([{name, birthdate}]),
+    ages (of children not named yet), interests ({child name or None:
+    [interest, ...]}) and preferred_activity.
+    children=False skips names, ages and counts, for answers to questions
+    about something else ("ballet, maybe 2 days a week"); about_children
+    says the question asked for the children, so "Mia 7" is an age.
+
+        "We're in Park Slope with two kids, Mia 2017-05-01 and Leo (5).
+         Mia loves ballet and soccer."
+    """
+    text = text or ''
+    slots = {}
+
+    location = _location(text)
+    if location:
+        slots['location'] = location
+
+    if children:
+        named, spans = _children(text, about_children)
+        if named:
+            slots['children'] = named
+        ages = _unnamed_ages(text, spans)
+        if ages:
+            slots['ages'] = ages
+
+        # "my kids are 5 and 7" says how many as well as how old
+        count = _count(text) or (len(ages) if not named else 0)
+        if count:
+            slots['num_children'] = count
+
+    interests = {}
+    for match in INTEREST_RE.finditer(text):
+        who = match.group(1)
+        owner = who.title() if _is_name(who) and who.lower() not in PRONOUNS else None
+        items = _split_list(match.group(2))
+        if items:
+            interests.setdefault(owner, []).extend(items)
+    if interests:
+        slots['interests'] = interests
+
+    preferred = PREFERRED_RE.search(text)
+    if preferred:
+        wanted = _split_list(preferred.group(1))
+        if wanted:
+            slots['preferred_activity'] = ', '.join(wanted)
+
+    return slots
@@ -0,0 +1,28 @@
+import pytest
+
+from gazetteer import GAZETTEER
+
+
+@pytest.mark.parametrize('text, key', [
+    ("NYC", 'manhattan'),
+    ("new york city", 'manhattan'),
+    ("New York, NY", 'manhattan'),
+    ("Park Slope, BK", 'park slope'),
+    ("we are in bk", 'brooklyn'),
+    ("les", 'lower east side'),
+    ("we live in the les", 'lower east side'),
+    ("UWS, 2 kids", 'upper west side'),
+    ("Brooklyn, NY 11215", 'park slope'),
+    ("williamsb", 'williamsburg'),
+])
+def test_resolve(text, key):
+    assert GAZETTEER.resolve(text).key == key
+
+
+@pytest.mark.parametrize('text', [
+    "we loved Les Miserables",
+    "Si, we have 2",
+    "my kid is into art",
+])
+def test_short_aliases_need_a_cue(text):
+    assert GAZETTEER.resolve(text) is None
@@ -0,0 +1,52 @@
+import pytest
+
+from catalog_store import activity_id
+from refinement import CandidatePool, parse_feedback
+
+SHOWN = [
+    {'name': 'BAX- Brooklyn Arts Exchange', 'url': 'https://bax.org'},
+    {'name': 'Chickenshed NYC', 'url': 'https://chickenshed.org'},
+    {'name': 'EBL Coaching', 'url': 'https://eblcoaching.com'},
+    {'name': 'Soccer Stars', 'url': 'https://soccerstars.com'},
+]
+IDS = [activity_id(item) for item in SHOWN]
+
+
+@pytest.mark.parametrize('feedback, excluded', [
+    ("not the 2nd one", [IDS[1]]),
+    ("remove #3", [IDS[2]]),
+    ("skip the third", [IDS[2]]),
+    ("drop the last one", [IDS[3]]),
+    ("no BAX please", [IDS[0]]),
+    ("not ebl", [IDS[2]]),
+    ("without soccer", [IDS[3]]),
+    ("not in NYC", []),
+])
+def test_exclusions(feedback, excluded):
+    assert parse_feedback(feedback, SHOWN)['exclude'] == excluded
+
+
+@pytest.mark.parametrize('feedback, different, activity_type', [
+    ("show me more", False, None),
+    ("more like the first one", False, None),
+    ("can you try again", False, None),
+    ("something different, maybe music instead", True, 'music'),
+    ("I'd rather do swimming", True, 'swimming'),
+])
+def test_different(feedback, different, activity_type):
+    deltas = parse_feedback(feedback, SHOWN)
+    assert deltas['different'] == different
+    assert deltas['activity_type'] == activity_type
+
+
+def test_closer_and_cheaper():
+    deltas = parse_feedback("too far and too expensive", SHOWN)
+    assert deltas['closer'] and deltas['cheaper'] and not deltas['different']
+
+
+def test_refined_state_round_trips():
+    pool = CandidatePool({}, [], 1).refined(parse_feedback("cheaper, and not the 2nd one", SHOWN), IDS)
+    state = pool.state()
+    assert state == {'excluded': [IDS[1]], 'constraints': {'cheaper': True}}
+    restored = CandidatePool({}, [], 1).with_state(state)
+    assert restored.excluded == pool.excluded and restored.constraints == pool.constraints
@@ -0,0 +1,118 @@
+from datetime import date
+
+import pytest
+
+from slot_extractor import birthdate_for_age, extract_slots, parse_child
+
+
+def names(slots):
+    return [child['name'] for child in slots.get('children', [])]
+
+
+def test_one_shot_introduction():
+    slots = extract_slots(
+        "We're in Park Slope with two kids, Mia 2017-05-01 and Leo (5). Mia loves ballet and soccer."
+    )
+    assert slots['location'] == 'Park Slope'
+    assert slots['num_children'] == 2
+    assert slots['children'] == [
+        {'name': 'Mia', 'birthdate': '2017-05-01'},
+        {'name': 'Leo', 'birthdate': birthdate_for_age(5)},
+    ]
+    assert slots['interests'] == {'Mia': ['ballet', 'soccer']}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Ava (6) and Ben, aged 4", ['Ava', 'Ben']),
+    ("Sam is 9 years old", ['Sam']),
+    ("Leo born March 3, 2019", ['Leo']),
+    ("I have 2 kids, Mia 7 and Leo 5", ['Mia', 'Leo']),
+    ("My daughter Mia is 7 and loves dance", ['Mia']),
+    ("3 kids: Ann 4, Bob 6 and Cy 8", ['Ann', 'Bob', 'Cy']),
+    ("my daughter Mia, 7", ['Mia']),
+    ("my son Leo is 5", ['Leo']),
+])
+def test_children_with_ages(text, expected):
+    assert names(extract_slots(text)) == expected
+
+
+@pytest.mark.parametrize('text', [
+    "Dance classes, maybe 2 days a week",
+    "Something for ages 5 to 7",
+    "Art after 3 pm",
+    "Mia 7 and Leo 5",
+    "class at 4 for my kid",
+    "Soccer 5 days a week",
+])
+def test_numbers_outside_a_child_context_are_not_ages(text):
+    assert 'children' not in extract_slots(text)
+
+
+@pytest.mark.parametrize('text, about_children, count, ages', [
+    ("Brooklyn, 2 kids", False, 2, None),
+    ("Upper West Side, 3 kids", False, 3, None),
+    ("Brooklyn 2", True, None, None),
+    ("Brooklyn - 1 child, age 6", False, 1, [6]),
+    ("my kids are 5 and 7", True, 2, [5, 7]),
+    ("a 4 year old and a 9 year old", False, 2, [4, 9]),
+])
+def test_places_and_verbs_are_not_names(text, about_children, count, ages):
+    slots = extract_slots(text, about_children=about_children)
+    assert 'children' not in slots
+    assert slots.get('num_children') == count
+    assert slots.get('ages') == ages
+
+
+@pytest.mark.parametrize('text, count', [
+    ("2 kids, a boy and a girl", 2),
+    ("a boy and a girl", 2),
+    ("one son and two daughters", 3),
+    ("twins and a daughter", 3),
+    ("three children: twins and a baby", 3),
+])
+def test_counts_of_the_same_children_are_not_added(text, count):
+    assert extract_slots(text)['num_children'] == count
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Mary Ann, 2017-05-01", {'name': 'Mary Ann', 'birthdate': '2017-05-01'}),
+    ("Leo, March 3, 2019", {'name': 'Leo', 'birthdate': '2019-03-03'}),
+    ("Brooklyn, 2 kids", None),
+    ("Mia, 7", None),
+])
+def test_parse_child(text, expected):
+    assert parse_child(text) == expected
+
+
+def test_bare_ages_when_the_question_asked_for_the_children():
+    slots = extract_slots("Mia 7 and Leo 5", about_children=True)
+    assert names(slots) == ['Mia', 'Leo']
+
+
+def test_interest_answers_are_not_read_for_children():
+    text = "Soccer like Leo (5), with two kids from school"
+    assert names(extract_slots(text)) == ['Leo']
+    slots = extract_slots(text, children=False)
+    assert 'children' not in slots and 'num_children' not in slots
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("Mia loves ballet and Leo likes soccer", {'Mia': ['ballet'], 'Leo': ['soccer']}),
+    ("he likes art and she likes music", {None: ['art', 'music']}),
+    ("Zoe loves painting, Max is into robots", {'Zoe': ['painting'], 'Max': ['robots']}),
+    ("He loves swimming and drawing but his sister Ava likes chess",
+     {None: ['swimming', 'drawing'], 'Ava': ['chess']}),
+])
+def test_interest_spans_stop_at_the_next_person(text, expected):
+    assert extract_slots(text)['interests'] == expected
+
+
+def test_location_from_zip_and_preferred_activity():
+    slots = extract_slots("We're at 11215 and looking for art classes or coding")
+    assert slots['location'] == '11215'
+    assert slots['preferred_activity'] == 'art classes, coding'
+
+
+def test_birthdate_for_age():
+    assert birthdate_for_age(6, date(2024, 2, 29)) == '2018-02-28'
+    assert birthdate_for_age(30) is None